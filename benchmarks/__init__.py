@@ -0,0 +1,6 @@
+#!/usr/bin/env python3
+#
+# Copyright 2022 Graviti. Licensed under MIT License.
+#
+
+"""Benchmarks of hit CLI with local fake git remotes and a fake Github API."""
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+#
+# Copyright 2022 Graviti. Licensed under MIT License.
+#
+
+"""The local stand-in of the Github endpoints used by hit push, land, clone, status and clean.
+
+The repositories are bare repos under '<remotes>/<owner>/<name>.git', the pull requests are kept in
+memory, and a merge fast-forwards the base branch of the upstream repo to the head of the pull
+request, so the git side of the commands sees the same state as with Github. The successful GET
+responses carry an ETag of their content, and the requests revalidating an unchanged ETag by
+'If-None-Match' are answered by '304 Not Modified' without a body, like Github does.
+
+"""
+
+import hashlib
+import json
+import os
+import re
+import subprocess
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
+from time import sleep, time
+from typing import Any, Dict, List, Optional, Tuple
+
+API_URL = "https://api.github.com"
+
+_REF_PATTERN = re.compile(r"(?:(\w+):\s*)?ref\(qualifiedName:\s*\$(\w+)\)")
+_PULL_REQUESTS_PATTERN = re.compile(r"(\w+):\s*pullRequests\(\s*headRefName:\s*\$(\w+)")
+
+
+class _PullRequest:  # pylint: disable=too-few-public-methods, too-many-instance-attributes
+    def __init__(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+        self, number: int, title: str, body: str, head_owner: str, head_branch: str, base: str
+    ) -> None:
+        self.number = number
+        self.title = title
+        self.body = body
+        self.head_owner = head_owner
+        self.head_branch = head_branch
+        self.base = base
+        self.state = "open"
+        self.merged = False
+        # The head of a closed pull request is kept, its head branch may have been deleted.
+        self.head_sha: Optional[str] = None
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeGithub:  # pylint: disable=too-many-instance-attributes
+    """The fake Github API server backed by local bare repos.
+
+    Arguments:
+        remotes_dirpath: The directory of the bare repos, like '<remotes>/<owner>/<name>.git'.
+        upstream_name: The full name of the upstream repo.
+        fork_owner: The owner of the fork of the upstream repo.
+        check_suites: The number of the successful check suites of each commit.
+        latency: The seconds to sleep before answering each request.
+
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+        self,
+        remotes_dirpath: str,
+        upstream_name: str,
+        fork_owner: str,
+        check_suites: int,
+        latency: float = 0,
+    ) -> None:
+        self.remotes_dirpath = remotes_dirpath
+        self.upstream_name = upstream_name
+        self.fork_owner = fork_owner
+        self.check_suites = check_suites
+        self.latency = latency
+        self.requests: "Counter[str]" = Counter()
+        self.responses: "Counter[str]" = Counter()
+
+        self._lock = Lock()
+        self._pull_requests: Dict[int, _PullRequest] = {}
+        self._server = _ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(self))
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """Get the url of the server.
+
+        Returns:
+            The url of the server, like 'http://127.0.0.1:12345'.
+
+        """
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> None:
+        """Start serving in a background thread."""
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop serving."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def add_pull_request(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+        self,
+        head_branch: str,
+        base: str,
+        title: str = "Benchmark",
+        body: str = "",
+        merged: bool = False,
+    ) -> int:
+        """Open a pull request from the branch of the fork.
+
+        Arguments:
+            head_branch: The name of the head branch in the fork.
+            base: The name of the base branch in the upstream repo.
+            title: The title of the pull request.
+            body: The body of the pull request.
+            merged: Whether to mark the pull request as merged, the base branch is not changed.
+
+        Returns:
+            The number of the pull request.
+
+        """
+        with self._lock:
+            pull_request = self._open_pull_request(self.fork_owner, head_branch, base, title, body)
+            if merged:
+                pull_request.head_sha = self._head_oid(pull_request)
+                pull_request.state = "closed"
+                pull_request.merged = True
+
+            return pull_request.number
+
+    def handle(
+        self, method: str, path: str, if_none_match: Optional[str], body: Optional[Dict[str, Any]]
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        """Handle one API request.
+
+        The responses are counted by '<status> <method> <path>' in 'responses', the numbers in the
+        path are replaced by '{id}'.
+
+        Arguments:
+            method: The HTTP method of the request.
+            path: The path of the request.
+            if_none_match: The 'If-None-Match' header of the request.
+            body: The decoded json body of the request.
+
+        Returns:
+            The status code, the extra headers and the content of the response.
+
+        """
+        path = path.split("?", 1)[0]
+        endpoint = f"{method} {_normalize(path)}"
+        self.requests[endpoint] += 1
+        if self.latency:
+            sleep(self.latency)
+
+        status, data = self._dispatch(method, path, body)
+        content = json.dumps(data).encode()
+        extra_headers = {}
+        if method == "GET" and status == 200:
+            etag = f'"{hashlib.sha1(content).hexdigest()}"'
+            extra_headers["ETag"] = etag
+            if if_none_match == etag:
+                status, content = 304, b""
+
+        self.responses[f"{status} {endpoint}"] += 1
+        return status, extra_headers, content
+
+    def _dispatch(
+        self, method: str, path: str, body: Optional[Dict[str, Any]]
+    ) -> Tuple[int, Dict[str, Any]]:
+        with self._lock:
+            if method == "POST" and path == "/graphql":
+                return self._graphql(body or {})
+
+            parts = path.strip("/").split("/")
+            if len(parts) < 3 or parts[0] != "repos":
+                return _not_found()
+
+            name = "/".join(parts[1:3])
+            if not os.path.isdir(self._git_dir(name)):
+                return _not_found()
+
+            if parts[3:4] == ["pulls"] and len(parts) > 4:
+                return self._rest_pull(method, parts[4:], body or {})
+
+            return self._rest_repo(method, name, parts[3:], body or {})
+
+    def _rest_repo(
+        self, method: str, name: str, parts: List[str], body: Dict[str, Any]
+    ) -> Tuple[int, Dict[str, Any]]:
+        if method == "GET" and not parts:
+            return 200, self._repo(name)
+
+        if method == "POST" and parts == ["forks"]:
+            return 202, self._repo(f"{self.fork_owner}/{name.split('/', 1)[1]}")
+
+        if method == "POST" and parts == ["pulls"]:
+            head_owner, _, head_branch = body["head"].rpartition(":")
+            pull_request = self._open_pull_request(
+                head_owner, head_branch, body["base"], body["title"], body.get("body") or ""
+            )
+            return 201, self._pull(pull_request)
+
+        if method == "GET" and len(parts) == 3 and parts[::2] == ["commits", "check-suites"]:
+            suites = self._suites()
+            return 200, {"total_count": len(suites), "check_suites": suites}
+
+        return _not_found()
+
+    def _rest_pull(
+        self, method: str, parts: List[str], body: Dict[str, Any]
+    ) -> Tuple[int, Dict[str, Any]]:
+        pull_request = self._pull_requests.get(int(parts[0])) if parts[0].isdigit() else None
+        if pull_request is None:
+            return _not_found()
+
+        if method == "GET" and len(parts) == 1:
+            return 200, self._pull(pull_request)
+
+        if method == "PATCH" and len(parts) == 1:
+            pull_request.title = body.get("title", pull_request.title)
+            pull_request.body = body.get("body", pull_request.body) or ""
+            pull_request.base = body.get("base", pull_request.base)
+            return 200, self._pull(pull_request)
+
+        if method == "PUT" and parts[1:] == ["merge"]:
+            return self._merge(pull_request, body.get("sha"))
+
+        return _not_found()
+
+    def _open_pull_request(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+        self, head_owner: str, head_branch: str, base: str, title: str, body: str
+    ) -> _PullRequest:
+        number = len(self._pull_requests) + 1
+        pull_request = _PullRequest(number, title, body, head_owner, head_branch, base)
+        self._pull_requests[number] = pull_request
+        return pull_request
+
+    def _graphql(self, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        # The queries with the 'PullRequestFields' fragment get the full nodes, the others only get
+        # the states of the pull requests.
+        variables = body.get("variables", {})
+        query = body.get("query", "")
+        refs = _REF_PATTERN.findall(query)
+        pulls = _PULL_REQUESTS_PATTERN.findall(query)
+        if not refs and not pulls:
+            return 200, {"errors": [{"message": "The query is not supported by the fake Github."}]}
+
+        name = f"{variables['owner']}/{variables['name']}"
+        full = "...PullRequestFields" in query
+        open_only = "states: OPEN" in query
+        repository = {}
+        for alias, variable in refs:
+            repository[alias or "ref"] = self._ref(name, variables[variable], full, open_only)
+        for alias, variable in pulls:
+            repository[alias] = {
+                "nodes": [
+                    self._pull_node(pull_request) if full else self._pull_state_node(pull_request)
+                    for pull_request in self._find_pull_requests(name, None, variables[variable])
+                    if pull_request.state == "open" or not open_only
+                ]
+            }
+
+        return 200, {"data": {"repository": repository}}
+
+    def _ref(
+        self, name: str, qualified_name: str, full: bool, open_only: bool
+    ) -> Optional[Dict[str, Any]]:
+        if _git(self._git_dir(name), "rev-parse", "--verify", "--quiet", qualified_name) is None:
+            return None
+
+        owner = name.split("/", 1)[0]
+        branch = qualified_name[len("refs/heads/") :]
+        nodes = [
+            self._pull_node(pull_request) if full else self._pull_state_node(pull_request)
+            for pull_request in self._find_pull_requests(self.upstream_name, owner, branch)
+            if pull_request.state == "open" or not open_only
+        ]
+        return {"associatedPullRequests": {"nodes": nodes}}
+
+    def _find_pull_requests(
+        self, name: str, head_owner: Optional[str], head_branch: str
+    ) -> List[_PullRequest]:
+        # The pull requests are ordered by the creation time, the newest first.
+        if name != self.upstream_name:
+            return []
+
+        return [
+            pull_request
+            for pull_request in reversed(list(self._pull_requests.values()))
+            if pull_request.head_branch == head_branch
+            and head_owner in (None, pull_request.head_owner)
+        ]
+
+    def _merge(self, pull_request: _PullRequest, sha: Optional[str]) -> Tuple[int, Dict[str, Any]]:
+        upstream = self._git_dir(self.upstream_name)
+        merging_ref = f"refs/pull/{pull_request.number}/head"
+        _git(
+            upstream,
+            "fetch",
+            "--quiet",
+            self._head_git_dir(pull_request),
+            f"+refs/heads/{pull_request.head_branch}:{merging_ref}",
+        )
+        head_sha = _git(upstream, "rev-parse", "--verify", "--quiet", merging_ref)
+        if head_sha is None or (sha and sha != head_sha):
+            return 409, {"message": "Head branch was modified. Review and try the merge again."}
+
+        # The fake merges by fast-forwarding, the pull request is expected to be up to date.
+        base_ref = f"refs/heads/{pull_request.base}"
+        if _git(upstream, "merge-base", "--is-ancestor", base_ref, head_sha) is None:
+            return 405, {"message": "Pull Request is not mergeable"}
+
+        _git(upstream, "update-ref", base_ref, head_sha)
+        pull_request.state = "closed"
+        pull_request.merged = True
+        pull_request.head_sha = head_sha
+        return 200, {"sha": head_sha, "merged": True, "message": "Pull Request successfully merged"}
+
+    def _repo(self, name: str) -> Dict[str, Any]:
+        owner, repo_name = name.split("/", 1)
+        return {
+            "id": abs(hash(name)),
+            "name": repo_name,
+            "full_name": name,
+            "owner": {"login": owner},
+            "private": False,
+            "visibility": "public",
+            "fork": owner == self.fork_owner,
+            "default_branch": "main",
+            "url": f"{API_URL}/repos/{name}",
+            "html_url": f"https://github.com/{name}",
+            "ssh_url": f"git@github.com:{name}.git",
+        }
+
+    def _pull(self, pull_request: _PullRequest) -> Dict[str, Any]:
+        commits = self._commits(pull_request)
+        url = f"https://github.com/{self.upstream_name}/pull/{pull_request.number}"
+        return {
+            "number": pull_request.number,
+            "state": pull_request.state,
+            "title": pull_request.title,
+            "body": pull_request.body or None,
+            "url": f"{API_URL}/repos/{self.upstream_name}/pulls/{pull_request.number}",
+            "html_url": url,
+            "commits": len(commits),
+            "merged": pull_request.merged,
+            "head": {
+                "ref": pull_request.head_branch,
+                "sha": commits[-1] if commits else None,
+                "label": f"{pull_request.head_owner}:{pull_request.head_branch}",
+                "user": {"login": pull_request.head_owner},
+            },
+            "base": {"ref": pull_request.base, "label": pull_request.base},
+        }
+
+    def _pull_node(self, pull_request: _PullRequest) -> Dict[str, Any]:
+        commits = self._commits(pull_request)
+        suites = [
+            {"status": suite["status"].upper(), "conclusion": suite["conclusion"].upper()}
+            for suite in self._suites()
+        ]
+        return {
+            "number": pull_request.number,
+            "url": f"https://github.com/{self.upstream_name}/pull/{pull_request.number}",
+            "title": pull_request.title,
+            "body": pull_request.body,
+            "headRefName": pull_request.head_branch,
+            "baseRefName": pull_request.base,
+            "baseRepository": {"nameWithOwner": self.upstream_name},
+            "isDraft": False,
+            "mergeable": "MERGEABLE",
+            "reviewDecision": "APPROVED",
+            "headRepositoryOwner": {"login": pull_request.head_owner},
+            "firstCommit": {"nodes": [{"commit": {"oid": commits[0]}}]},
+            "lastCommit": {
+                "totalCount": len(commits),
+                "nodes": [{"commit": {"oid": commits[-1], "checkSuites": {"nodes": suites}}}],
+            },
+        }
+
+    def _pull_state_node(self, pull_request: _PullRequest) -> Dict[str, Any]:
+        return {
+            "state": "MERGED" if pull_request.merged else pull_request.state.upper(),
+            "headRefOid": self._head_oid(pull_request),
+            "baseRepository": {"nameWithOwner": self.upstream_name},
+            "headRepositoryOwner": {"login": pull_request.head_owner},
+        }
+
+    def _head_oid(self, pull_request: _PullRequest) -> Optional[str]:
+        if pull_request.head_sha:
+            return pull_request.head_sha
+
+        return _git(
+            self._head_git_dir(pull_request), "rev-parse", f"refs/heads/{pull_request.head_branch}"
+        )
+
+    def _commits(self, pull_request: _PullRequest) -> List[str]:
+        base_sha = _git(
+            self._git_dir(self.upstream_name), "rev-parse", f"refs/heads/{pull_request.base}"
+        )
+        output = _git(
+            self._head_git_dir(pull_request),
+            "rev-list",
+            "--reverse",
+            f"refs/heads/{pull_request.head_branch}",
+            "--not",
+            base_sha or "",
+        )
+        return output.split() if output else []
+
+    def _suites(self) -> List[Dict[str, str]]:
+        return [{"status": "completed", "conclusion": "success"}] * self.check_suites
+
+    def _head_git_dir(self, pull_request: _PullRequest) -> str:
+        return self._git_dir(f"{pull_request.head_owner}/{self.upstream_name.split('/', 1)[1]}")
+
+    def _git_dir(self, name: str) -> str:
+        return os.path.join(self.remotes_dirpath, f"{name}.git")
+
+
+def _make_handler(github: FakeGithub) -> type:
+    class _Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self) -> None:  # pylint: disable=invalid-name
+            """Handle the request by the fake Github."""
+            self._handle()
+
+        do_POST = do_PATCH = do_PUT = do_DELETE = do_GET
+
+        def log_message(self, *_: Any) -> None:
+            pass
+
+        def _handle(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            data = self.rfile.read(length) if length else b""
+            status, headers, content = github.handle(
+                self.command,
+                self.path,
+                self.headers.get("If-None-Match"),
+                json.loads(data) if data else None,
+            )
+
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(content)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header("X-RateLimit-Limit", "5000")
+            self.send_header("X-RateLimit-Remaining", "4999")
+            self.send_header("X-RateLimit-Reset", str(int(time()) + 3600))
+            self.end_headers()
+            self.wfile.write(content)
+
+    return _Handler
+
+
+def _normalize(path: str) -> str:
+    return re.sub(r"/([0-9a-f]{40}|\d+)(?=/|$)", "/{id}", path)
+
+
+def _not_found() -> Tuple[int, Dict[str, Any]]:
+    return 404, {"message": "Not Found"}
+
+
+def _git(git_dir: str, *args: str) -> Optional[str]:
+    result = subprocess.run(
+        ["git", "--git-dir", git_dir, *args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=False,
+    )
+    return result.stdout.decode().strip() if result.returncode == 0 else None
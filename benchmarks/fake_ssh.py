@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+#
+# Copyright 2022 Graviti. Licensed under MIT License.
+#
+
+"""The local stand-in of ssh for the git remotes of the benchmarks.
+
+It is installed as 'ssh' in PATH, runs the 'git-upload-pack' and 'git-receive-pack' commands of
+git on the bare repos under '$HIT_BENCHMARK_REMOTES', and appends one line for each connection to
+'$HIT_BENCHMARK_SSH_LOG':
+
+    master <host>   The connection became the ControlMaster of its ControlPath.
+    client <host>   The connection was multiplexed over an existing ControlMaster.
+    direct <host>   The connection did not use ControlMaster.
+    exit <host>     The ControlMaster was stopped by 'ssh -O exit'.
+
+The ControlMaster is emulated by creating the ControlPath exclusively, the first connection which
+creates it becomes the master, like the first ssh binding the socket.
+
+"""
+
+import os
+import shlex
+import sys
+from typing import Dict, List, NoReturn, Tuple
+
+_OPTIONS_WITH_VALUE = {"-b", "-c", "-D", "-E", "-F", "-i", "-J", "-l", "-L", "-m", "-O", "-p", "-R"}
+_GIT_COMMANDS = {"git-upload-pack", "git-receive-pack", "git-upload-archive"}
+_MASTER_MODES = {"yes", "auto", "ask", "autoask"}
+
+
+def main(args: List[str]) -> NoReturn:
+    """Run the remote git command of the ssh arguments and log the connection.
+
+    Arguments:
+        args: The arguments of ssh, like '-o ControlMaster=auto git@github.com git-upload-pack ...'.
+
+    """
+    options, flags, destination, command = _parse_args(args)
+    user, _, host = destination.rpartition("@")
+    control_path = _expand_control_path(options.get("controlpath", ""), user, host, flags)
+
+    if flags.get("-O") == "exit":
+        if control_path:
+            _remove(control_path)
+        _log("exit", host)
+        sys.exit(0)
+
+    if control_path and options.get("controlmaster", "no").lower() in _MASTER_MODES:
+        try:
+            os.close(os.open(control_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+            _log("master", host)
+        except FileExistsError:
+            _log("client", host)
+    else:
+        _log("direct", host)
+
+    argv = shlex.split(command)
+    if not argv or argv[0] not in _GIT_COMMANDS:
+        sys.exit(f"fake ssh: unsupported command '{command}'")
+
+    os.chdir(os.environ["HIT_BENCHMARK_REMOTES"])
+    os.execvp("git", ["git", argv[0][len("git-") :], *argv[1:]])
+
+
+def _parse_args(args: List[str]) -> Tuple[Dict[str, str], Dict[str, str], str, str]:
+    options: Dict[str, str] = {}
+    flags: Dict[str, str] = {}
+    arg_iter = iter(args)
+    for arg in arg_iter:
+        if arg == "-o":
+            key, _, value = next(arg_iter, "").partition("=")
+            options.setdefault(key.lower(), value)
+        elif arg in _OPTIONS_WITH_VALUE:
+            flags[arg] = next(arg_iter, "")
+        elif arg.startswith("-"):
+            flags[arg] = ""
+        else:
+            return options, flags, arg, " ".join(arg_iter)
+
+    sys.exit("fake ssh: no destination")
+
+
+def _expand_control_path(path: str, user: str, host: str, flags: Dict[str, str]) -> str:
+    if not path or path.lower() == "none":
+        return ""
+
+    tokens = {"%%": "%", "%h": host, "%p": flags.get("-p") or "22", "%r": user or "git"}
+    expanded = []
+    index = 0
+    while index < len(path):
+        token = path[index : index + 2]
+        if token in tokens:
+            expanded.append(tokens[token])
+            index += 2
+        else:
+            expanded.append(path[index])
+            index += 1
+
+    return "".join(expanded)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _log(kind: str, host: str) -> None:
+    fd = os.open(os.environ["HIT_BENCHMARK_SSH_LOG"], os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+    try:
+        os.write(fd, f"{kind} {host}\n".encode())
+    finally:
+        os.close(fd)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
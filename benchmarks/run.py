@@ -0,0 +1,695 @@
+#!/usr/bin/env python3
+#
+# Copyright 2022 Graviti. Licensed under MIT License.
+#
+
+"""Run the end-to-end benchmarks of hit push, land, clone, status and clean.
+
+Each run builds throwaway 'upstream' and 'origin' bare repos, which are reached through
+'url.<base>.insteadOf' rules from their 'git@github.com:' urls, starts a fake Github API, then runs
+the '_implement_*' entry point in a fresh worker process, which reports the wall time, the number
+of spawned subprocesses and the peak RSS. The API requests are counted by the fake Github for each
+endpoint. The 'status' and 'clean' scenarios run in a repo with '--branches' branches, and the
+benchmarks fail unless they send one GraphQL query for every 50 branches. The benchmarks also fail
+when hit push, status or clean spawn more subprocesses than the fixed limits of '_MAX_SUBPROCESSES'.
+The 'land-ssh' scenario reaches the remotes through the fake ssh of 'benchmarks/fake_ssh.py'
+instead, and fails unless all the connections share one ssh master connection for each host.
+
+The 'push-cached' scenario runs hit push twice on a branch with an open pull request and measures
+the second run, the benchmarks fail unless all of its GET requests are answered by '304 Not
+Modified'. The 'import' scenario times the import of 'hit.cli', the benchmarks fail when its median
+exceeds '--max-import-time'. The 'startup' and 'startup-daemon' scenarios time 'hit --version'
+through the 'hit' entry point, executed in process and forwarded to a running hit daemon
+respectively. The 'completion' scenario times the completion of 'hit clean <TAB>' in a repo with
+'--branches' local branches through the running hit daemon, the benchmarks fail when its median
+exceeds '--max-completion-time'.
+
+Usage:
+    python -m benchmarks.run --files 1000 --commits 3 --check-suites 10 --output result.json
+
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+from shlex import quote
+from statistics import median
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from benchmarks.fake_github import API_URL, FakeGithub
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_UPSTREAM = "org/repo"
+_FORK_OWNER = "me"
+_BASE = "main"
+_BRANCH = "feature"
+_SCENARIOS = (
+    "push",
+    "push-cached",
+    "land",
+    "land-ssh",
+    "status",
+    "clean",
+    "clone",
+    "import",
+    "startup",
+    "startup-daemon",
+    "completion",
+)
+_IMPORT_SCRIPT = """\
+import json, sys, time
+start = time.perf_counter()
+import hit.cli
+json.dump({"wall_time": time.perf_counter() - start, "modules": len(sys.modules)}, sys.stdout)
+"""
+_BRANCHES_PER_QUERY = 50
+# The subprocesses of the commands do not depend on the numbers of the files and the branches.
+_MAX_SUBPROCESSES = {"push": 5, "push-cached": 4, "status": 2, "clean": 9}
+_GIT_OPTIONS_WITH_VALUE = {"-C", "-c", "--git-dir", "--work-tree"}
+
+
+def main() -> None:
+    """Parse the arguments and run the benchmarks, or run one scenario as the worker."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument(
+        "scenarios", nargs="*", metavar="SCENARIO", help=f"One of {', '.join(_SCENARIOS)}."
+    )
+    parser.add_argument("--files", type=int, default=100, help="Number of files in the repo.")
+    parser.add_argument("--file-size", type=int, default=4096, help="Size of each file in bytes.")
+    parser.add_argument("--commits", type=int, default=1, help="Number of commits in the PR.")
+    parser.add_argument("--check-suites", type=int, default=3, help="Check suites of each commit.")
+    parser.add_argument("--branches", type=int, default=120, help="Number of local branches.")
+    parser.add_argument("--latency", type=float, default=0, help="Seconds of fake API latency.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs of each scenario.")
+    parser.add_argument("--output", help="The json file to store the results.")
+    parser.add_argument(
+        "--max-import-time",
+        type=float,
+        default=0.15,
+        help="Fail when the median seconds of importing 'hit.cli' exceeds it.",
+    )
+    parser.add_argument(
+        "--max-completion-time",
+        type=float,
+        default=0.15,
+        help="Fail when the median seconds of completing 'hit clean <TAB>' exceeds it.",
+    )
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _run_worker(args.worker)
+        return
+
+    for scenario in args.scenarios:
+        if scenario not in _SCENARIOS:
+            parser.error(f"unknown scenario '{scenario}', choose from {', '.join(_SCENARIOS)}")
+
+    results = []
+    for scenario in args.scenarios or _SCENARIOS:
+        for index in range(args.repeat):
+            result = _run_scenario(scenario, args)
+            result.update(scenario=scenario, run=index)
+            results.append(result)
+
+    _print_summary(results)
+    if args.output:
+        report = {
+            "environment": _get_environment(),
+            "parameters": {
+                key: value
+                for key, value in vars(args).items()
+                if key not in ("scenarios", "output", "worker")
+            },
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+            fp.write("\n")
+
+    failures = _check_results(results, args)
+    if failures:
+        print("\n".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+def _run_scenario(scenario: str, args: argparse.Namespace) -> Dict[str, Any]:
+    root = tempfile.mkdtemp(prefix="hit-benchmark-")
+    try:
+        env = _prepare_environment(root, ssh=scenario == "land-ssh")
+        if scenario == "import":
+            return _run_import(env)
+        if scenario.startswith("startup"):
+            return _run_startup(env, daemon=scenario == "startup-daemon")
+        if scenario == "completion":
+            return _run_completion(root, env, args.branches)
+
+        remotes = os.path.join(root, "remotes")
+        _prepare_remotes(remotes, env, args.files, args.file_size)
+
+        github = FakeGithub(remotes, _UPSTREAM, _FORK_OWNER, args.check_suites, args.latency)
+        workdir = os.path.join(root, "work")
+        os.makedirs(workdir)
+        if scenario in ("push", "push-cached", "land", "land-ssh"):
+            workdir = _prepare_work_repo(workdir, env, args.commits, push=scenario != "push")
+            if scenario in ("land", "land-ssh"):
+                github.add_pull_request(_BRANCH, _BASE)
+            elif scenario == "push-cached":
+                # The pull request matches the last commit, so the first run does not edit it.
+                last = args.commits - 1
+                github.add_pull_request(_BRANCH, _BASE, f"Change {last}", f"The body {last}.")
+
+        elif scenario in ("status", "clean"):
+            workdir = _prepare_branches(
+                workdir, env, github, remotes, args.branches, land=scenario == "clean"
+            )
+
+        github.start()
+        try:
+            worker_env = dict(env, HIT_BENCHMARK_API=github.url)
+            if scenario == "push-cached":
+                # The first run caches the pull request number and the responses, only the second
+                # run is measured.
+                _spawn_worker(scenario, workdir, root, worker_env)
+                github.requests.clear()
+                github.responses.clear()
+            if scenario == "land-ssh":
+                # The connections of preparing the repos are not counted.
+                with open(env["HIT_BENCHMARK_SSH_LOG"], "w", encoding="utf-8"):
+                    pass
+            result = _spawn_worker(scenario, workdir, root, worker_env)
+        finally:
+            github.stop()
+
+        if scenario == "land-ssh":
+            with open(env["HIT_BENCHMARK_SSH_LOG"], encoding="utf-8") as fp:
+                result["ssh_connections"] = dict(sorted(Counter(fp.read().splitlines()).items()))
+
+        result["api_requests"] = sum(github.requests.values())
+        result["api_endpoints"] = dict(sorted(github.requests.items()))
+        result["api_responses"] = dict(sorted(github.responses.items()))
+        return result
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def _prepare_environment(root: str, ssh: bool = False) -> Dict[str, str]:
+    # With 'ssh', the 'git@github.com:' urls are reached through the fake ssh instead of the
+    # 'insteadOf' rule.
+    home = os.path.join(root, "home")
+    os.makedirs(home)
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if not key.startswith(("GIT_", "HIT_", "XDG_")) and key != "SSH_AUTH_SOCK"
+    }
+    runtime_dir = os.path.join(root, "run")
+    os.makedirs(runtime_dir, mode=0o700)
+    env.update(
+        HOME=home,
+        XDG_CACHE_HOME=os.path.join(root, "cache"),
+        XDG_RUNTIME_DIR=runtime_dir,
+        PYTHONPATH=os.pathsep.join(filter(None, [_ROOT, env.get("PYTHONPATH")])),
+    )
+
+    remotes = os.path.join(root, "remotes")
+    with open(os.path.join(home, ".gitconfig"), "w", encoding="utf-8") as fp:
+        fp.write(
+            "[user]\n\tname = hit benchmark\n\temail = benchmark@example.com\n"
+            f"[init]\n\tdefaultBranch = {_BASE}\n"
+            "[advice]\n\tdetachedHead = false\n"
+        )
+        if not ssh:
+            fp.write(f'[url "file://{remotes}/"]\n\tinsteadOf = git@github.com:\n')
+    with open(os.path.join(home, ".hitconfig"), "w", encoding="utf-8") as fp:
+        fp.write("[github]\ntoken = benchmark\n")
+
+    if ssh:
+        bin_dirpath = os.path.join(root, "bin")
+        os.makedirs(bin_dirpath)
+        ssh_path = os.path.join(bin_dirpath, "ssh")
+        with open(ssh_path, "w", encoding="utf-8") as fp:
+            fake_ssh = os.path.join(_ROOT, "benchmarks", "fake_ssh.py")
+            fp.write(f'#!/bin/sh\nexec {quote(sys.executable)} {quote(fake_ssh)} "$@"\n')
+        os.chmod(ssh_path, 0o755)
+        env.update(
+            PATH=os.pathsep.join([bin_dirpath, env.get("PATH", os.defpath)]),
+            HIT_BENCHMARK_REMOTES=remotes,
+            HIT_BENCHMARK_SSH_LOG=os.path.join(root, "ssh.log"),
+        )
+
+    return env
+
+
+def _prepare_remotes(remotes: str, env: Dict[str, str], files: int, file_size: int) -> None:
+    seed = os.path.join(remotes, "seed")
+    _git(env, "init", "--quiet", seed)
+    for index in range(files):
+        with open(os.path.join(seed, f"file{index}.txt"), "wb") as fp:
+            fp.write(os.urandom(file_size // 2).hex().encode())
+    _git(env, "-C", seed, "add", ".")
+    _git(env, "-C", seed, "commit", "--quiet", "-m", "Initial commit")
+
+    upstream = os.path.join(remotes, f"{_UPSTREAM}.git")
+    fork = os.path.join(remotes, _FORK_OWNER, f"{_UPSTREAM.split('/', 1)[1]}.git")
+    _git(env, "clone", "--quiet", "--bare", seed, upstream)
+    _git(env, "clone", "--quiet", "--bare", upstream, fork)
+    shutil.rmtree(seed)
+
+
+def _clone_work_repo(workdir: str, env: Dict[str, str]) -> str:
+    repo = os.path.join(workdir, "repo")
+    _git(env, "clone", "--quiet", "--origin", "upstream", f"git@github.com:{_UPSTREAM}.git", repo)
+    _git(env, "-C", repo, "remote", "add", "origin", f"git@github.com:{_FORK_OWNER}/repo.git")
+    _git(env, "-C", repo, "fetch", "--quiet", "origin")
+    _git(env, "-C", repo, "branch", "--quiet", f"--set-upstream-to=origin/{_BASE}")
+    _git(env, "-C", repo, "config", "hit.baseBranch", _BASE)
+    _git(env, "-C", repo, "config", "remote.upstream.gh-resolved", "base")
+    return repo
+
+
+def _prepare_work_repo(workdir: str, env: Dict[str, str], commits: int, push: bool) -> str:
+    repo = _clone_work_repo(workdir, env)
+    _git(env, "-C", repo, "checkout", "--quiet", "-b", _BRANCH)
+    for index in range(commits):
+        with open(os.path.join(repo, "file0.txt"), "a", encoding="utf-8") as fp:
+            fp.write(f"change {index}\n")
+        _git(env, "-C", repo, "commit", "--quiet", "-am", f"Change {index}\n\nThe body {index}.")
+
+    if push:
+        _git(env, "-C", repo, "push", "--quiet", "--set-upstream", "origin", _BRANCH)
+
+    return repo
+
+
+def _run_import(env: Dict[str, str]) -> Dict[str, Any]:
+    process = subprocess.run(
+        [sys.executable, "-c", _IMPORT_SCRIPT],
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    return json.loads(process.stdout)  # type: ignore[no-any-return]
+
+
+def _run_startup(env: Dict[str, str], daemon: bool) -> Dict[str, Any]:
+    if not daemon:
+        env = dict(env, HIT_NO_DAEMON="1")
+        return {"wall_time": _time_hit(env, "--version")[0]}
+
+    _time_hit(env, "daemon", "start")
+    try:
+        # The first command forwarded to the daemon is not counted, it may still be warming up.
+        _time_hit(env, "--version")
+        return {"wall_time": _time_hit(env, "--version")[0]}
+    finally:
+        _time_hit(env, "daemon", "stop")
+
+
+def _run_completion(root: str, env: Dict[str, str], branches: int) -> Dict[str, Any]:
+    repo = os.path.join(root, "work", "repo")
+    _git(env, "init", "--quiet", repo)
+    _git(env, "-C", repo, "commit", "--quiet", "--allow-empty", "-m", "Initial commit")
+    names = [f"branch{index}" for index in range(branches)]
+    _update_refs(repo, env, "".join(f"create refs/heads/{name} HEAD\n" for name in names))
+
+    complete_env = dict(env, _HIT_COMPLETE="bash_complete", COMP_WORDS="hit clean ", COMP_CWORD="2")
+    _time_hit(env, "daemon", "start")
+    try:
+        _time_hit(complete_env, cwd=repo)
+        wall_time, output = _time_hit(complete_env, cwd=repo)
+    finally:
+        _time_hit(env, "daemon", "stop")
+
+    completed = {line.split(",", 1)[-1] for line in output.splitlines()}
+    if not completed.issuperset(names):
+        raise SystemExit(
+            f"Benchmark 'completion' completed {len(completed)} of {branches} branches."
+        )
+
+    return {"wall_time": wall_time}
+
+
+def _time_hit(env: Dict[str, str], *args: str, cwd: Optional[str] = None) -> Tuple[float, str]:
+    start = perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-m", "hit.client", *args],
+        cwd=cwd,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    return perf_counter() - start, process.stdout.decode()
+
+
+def _prepare_branches(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+    workdir: str, env: Dict[str, str], github: FakeGithub, remotes: str, branches: int, land: bool
+) -> str:
+    # All the branches point to one commit and are pushed to origin with one pull request each.
+    # When 'land' is set, two thirds of the pull requests are merged, and the head branches of
+    # half of them are deleted from origin, like the branches landed by Github.
+    repo = _clone_work_repo(workdir, env)
+    names = [f"branch{index}" for index in range(branches)]
+    _git(env, "-C", repo, "checkout", "--quiet", "-b", names[0])
+    _git(env, "-C", repo, "commit", "--quiet", "--allow-empty", "-m", "Change\n\nThe body.")
+    _update_refs(repo, env, "".join(f"create refs/heads/{name} HEAD\n" for name in names[1:]))
+    _git(env, "-C", repo, "push", "--quiet", "--set-upstream", "origin", *names)
+
+    for index, name in enumerate(names):
+        github.add_pull_request(name, _BASE, merged=land and index % 3 != 2)
+
+    if land:
+        deleted = "".join(f"delete refs/heads/{name}\n" for name in names[::3])
+        _update_refs(os.path.join(remotes, _FORK_OWNER, "repo.git"), env, deleted)
+
+    return repo
+
+
+def _update_refs(repo: str, env: Dict[str, str], commands: str) -> None:
+    subprocess.run(
+        ["git", "-C", repo, "update-ref", "--stdin"],
+        input=commands.encode(),
+        env=env,
+        check=True,
+    )
+
+
+def _spawn_worker(scenario: str, workdir: str, root: str, env: Dict[str, str]) -> Dict[str, Any]:
+    result_path = os.path.join(root, "result.json")
+    log_path = os.path.join(root, "worker.log")
+    with open(log_path, "wb") as log:
+        process = subprocess.run(
+            [sys.executable, "-m", "benchmarks.run", "--worker", f"{scenario}:{result_path}"],
+            cwd=workdir,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            check=False,
+        )
+
+    if process.returncode:
+        with open(log_path, encoding="utf-8", errors="replace") as fp:
+            sys.stderr.write(fp.read())
+        raise SystemExit(f"Benchmark '{scenario}' failed with exit code {process.returncode}.")
+
+    with open(result_path, encoding="utf-8") as fp:
+        return json.load(fp)  # type: ignore[no-any-return]
+
+
+def _run_worker(worker: str) -> None:
+    scenario, result_path = worker.split(":", 1)
+    _redirect_github_api(os.environ["HIT_BENCHMARK_API"])
+    commands = _count_subprocesses()
+
+    # pylint: disable=import-outside-toplevel
+    from hit.clean import _implement_clean
+    from hit.clone import _implement_clone
+    from hit.land import _implement_land
+    from hit.push import _implement_push
+    from hit.status import _implement_status
+
+    entry_points: Dict[str, Callable[[], None]] = {
+        "push": lambda: _implement_push("", False, False),
+        "push-cached": lambda: _implement_push("", False, False),
+        "land": lambda: _implement_land(True, False, 0, False, False),
+        "land-ssh": _land_with_ssh_multiplexing,
+        "status": lambda: _implement_status(False, 0),
+        "clean": lambda: _implement_clean(None, True, True),
+        "clone": lambda: _implement_clone(_UPSTREAM, None, None, None, (), False, True),
+    }
+
+    start = perf_counter()
+    entry_points[scenario]()
+    wall_time = perf_counter() - start
+
+    result = {
+        "wall_time": wall_time,
+        "subprocesses": sum(commands.values()),
+        "subprocess_commands": dict(sorted(commands.items())),
+        "peak_rss_kib": _get_peak_rss(),
+    }
+    with open(result_path, "w", encoding="utf-8") as fp:
+        json.dump(result, fp)
+
+
+def _land_with_ssh_multiplexing() -> None:
+    # The multiplexing is started by the 'hit' group of the CLI, which is skipped by the worker.
+    # pylint: disable=import-outside-toplevel
+    from hit.land import _implement_land
+    from hit.utility import start_ssh_multiplexing, stop_ssh_multiplexing
+
+    control_dir = start_ssh_multiplexing()
+    try:
+        _implement_land(True, False, 0, False, False)
+    finally:
+        if control_dir:
+            stop_ssh_multiplexing(control_dir)
+
+
+def _redirect_github_api(url: str) -> None:
+    # The requests to Github still go through the shared session and its caching adapter, only the
+    # scheme and the host are replaced right before sending.
+    # pylint: disable=import-outside-toplevel
+    import requests
+
+    from hit.session import (
+        CachingAdapter,
+        RateLimiter,
+        ResponseCache,
+        get_session,
+        http_cache_dirpath,
+        rate_limit_filepath,
+    )
+
+    target = urlsplit(url)
+
+    class _RedirectingAdapter(CachingAdapter):
+        def _send(
+            self, request: requests.PreparedRequest, stream: bool, **kwargs: Any
+        ) -> requests.Response:
+            request.url = (
+                urlsplit(str(request.url))
+                ._replace(scheme=target.scheme, netloc=target.netloc)
+                .geturl()
+            )
+            return super()._send(request, stream, **kwargs)
+
+    get_session().mount(
+        API_URL,
+        _RedirectingAdapter(
+            ResponseCache(http_cache_dirpath()), RateLimiter(rate_limit_filepath())
+        ),
+    )
+
+
+def _count_subprocesses() -> "Counter[str]":
+    # pylint: disable=protected-access
+    commands: "Counter[str]" = Counter()
+    lock = Lock()
+    execute_child = subprocess.Popen._execute_child  # type: ignore[attr-defined]
+
+    def _execute_child(self: "subprocess.Popen[Any]", args: Any, *rest: Any, **kwargs: Any) -> Any:
+        argv = (
+            [os.fsdecode(args)] if isinstance(args, (str, bytes)) else list(map(os.fsdecode, args))
+        )
+        with lock:
+            commands[_get_command_name(argv)] += 1
+        return execute_child(self, args, *rest, **kwargs)
+
+    subprocess.Popen._execute_child = _execute_child  # type: ignore[attr-defined]
+    return commands
+
+
+def _get_command_name(argv: List[str]) -> str:
+    name = os.path.basename(argv[0])
+    if name != "git":
+        return name
+
+    arg_iter = iter(argv[1:])
+    for arg in arg_iter:
+        if arg in _GIT_OPTIONS_WITH_VALUE:
+            next(arg_iter, None)
+        elif not arg.startswith("-"):
+            return f"git {arg}"
+
+    return name
+
+
+def _get_peak_rss() -> int:
+    # The peak RSS of the children is not reported, Linux keeps the RSS of the forked python
+    # process in it across the exec.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _get_environment() -> Dict[str, Any]:
+    from hit import __version__  # pylint: disable=import-outside-toplevel
+
+    revision = subprocess.run(
+        ["git", "-C", _ROOT, "rev-parse", "--short", "HEAD"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=False,
+    )
+    git_version = subprocess.run(["git", "--version"], stdout=subprocess.PIPE, check=True)
+    return {
+        "hit_version": __version__,
+        "revision": revision.stdout.decode().strip(),
+        "python": platform.python_version(),
+        "git": git_version.stdout.decode().strip(),
+        "platform": platform.platform(),
+    }
+
+
+def _check_results(results: List[Dict[str, Any]], args: argparse.Namespace) -> List[str]:
+    failures = []
+    for scenario, limit, action in (
+        ("import", args.max_import_time, "Importing 'hit.cli'"),
+        ("completion", args.max_completion_time, "Completing 'hit clean <TAB>'"),
+    ):
+        wall_times = [result["wall_time"] for result in results if result["scenario"] == scenario]
+        if wall_times and median(wall_times) > limit:
+            failures.append(
+                f"{action} took {median(wall_times):.3f}s, over the limit of {limit:.3f}s."
+            )
+
+    failures.extend(_check_push_cached(results))
+    failures.extend(_check_graphql_queries(results, args.branches))
+    failures.extend(_check_subprocesses(results))
+    failures.extend(_check_ssh_connections(results))
+    return failures
+
+
+def _check_push_cached(results: List[Dict[str, Any]]) -> List[str]:
+    for result in results:
+        if result["scenario"] != "push-cached":
+            continue
+
+        responses = result["api_responses"]
+        full = sum(count for key, count in responses.items() if key.startswith("200 GET "))
+        not_modified = sum(count for key, count in responses.items() if key.startswith("304 GET "))
+        if full or not not_modified:
+            return [
+                f"The second 'hit push' got {full} full and {not_modified} '304 Not Modified' GET "
+                "responses, all of its GET requests are expected to be revalidated."
+            ]
+
+    return []
+
+
+def _check_graphql_queries(results: List[Dict[str, Any]], branches: int) -> List[str]:
+    # hit status queries the pull requests of all the branches, and hit clean queries the states of
+    # them and then the states of the deleted head branches, one query per 50 branches each.
+    expected = {
+        "push": 1,
+        "land": 1,
+        "status": -(-branches // _BRANCHES_PER_QUERY),
+        "clean": -(-branches // _BRANCHES_PER_QUERY)
+        + -(-len(range(0, branches, 3)) // _BRANCHES_PER_QUERY),
+    }
+    failures = []
+    for scenario in dict.fromkeys(result["scenario"] for result in results):
+        if scenario not in expected:
+            continue
+
+        counts = {
+            result["api_endpoints"].get("POST /graphql", 0)
+            for result in results
+            if result["scenario"] == scenario
+        }
+        if counts != {expected[scenario]}:
+            failures.append(
+                f"'hit {scenario}' sent {', '.join(map(str, sorted(counts)))} GraphQL queries, "
+                f"{expected[scenario]} are expected with {branches} branches."
+            )
+
+    return failures
+
+
+def _check_subprocesses(results: List[Dict[str, Any]]) -> List[str]:
+    failures = []
+    for scenario, limit in _MAX_SUBPROCESSES.items():
+        for result in results:
+            if result["scenario"] == scenario and result["subprocesses"] > limit:
+                commands = ", ".join(
+                    f"{name} x{count}" for name, count in result["subprocess_commands"].items()
+                )
+                failures.append(
+                    f"'hit {scenario}' spawned {result['subprocesses']} subprocesses, over the "
+                    f"limit of {limit}: {commands}."
+                )
+                break
+
+    return failures
+
+
+def _check_ssh_connections(results: List[Dict[str, Any]]) -> List[str]:
+    # All the git network operations of the command are expected to share one master connection
+    # for each host, the 'exit' lines of stopping the masters are not connections.
+    for result in results:
+        if result["scenario"] != "land-ssh":
+            continue
+
+        masters: "Counter[str]" = Counter()
+        direct = 0
+        for line, count in result["ssh_connections"].items():
+            kind, host = line.split(" ", 1)
+            if kind == "master":
+                masters[host] += count
+            elif kind == "direct":
+                direct += count
+
+        if direct or any(count != 1 for count in masters.values()):
+            connections = ", ".join(
+                f"{line} x{count}" for line, count in result["ssh_connections"].items()
+            )
+            return [
+                "'hit land' is expected to open one ssh master connection for each host and "
+                f"multiplex the others over it, got: {connections}."
+            ]
+
+    return []
+
+
+def _print_summary(results: List[Dict[str, Any]]) -> None:
+    header = f"{'SCENARIO':<14}  {'WALL TIME':>9}  {'SUBPROCESSES':>12}  {'API REQUESTS':>12}"
+    print(f"{header}  {'PEAK RSS':>10}")
+    for scenario in dict.fromkeys(result["scenario"] for result in results):
+        runs = [result for result in results if result["scenario"] == scenario]
+        print(
+            f"{scenario:<14}  {_format_median(runs, 'wall_time', '.3f', 's'):>9}  "
+            f"{_format_median(runs, 'subprocesses', 'g'):>12}  "
+            f"{_format_median(runs, 'api_requests', 'g'):>12}  "
+            f"{_format_median(runs, 'peak_rss_kib', '.1f', ' MiB', 1024):>10}"
+        )
+
+
+def _format_median(
+    runs: List[Dict[str, Any]], key: str, spec: str, unit: str = "", scale: int = 1
+) -> str:
+    # The startup scenarios only measure the wall time, the other columns are shown as '-'.
+    if key not in runs[0]:
+        return "-"
+
+    return f"{median(run[key] for run in runs) / scale:{spec}}{unit}"
+
+
+def _git(env: Dict[str, str], *args: str) -> None:
+    subprocess.run(["git", *args], env=env, stdout=subprocess.DEVNULL, check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,9 +8,9 @@
 from configparser import ConfigParser
 
 import click
-from github import Github
 from github.GithubException import BadCredentialsException
 
+from hit.session import get_github
 from hit.utility import config_filepath, fatal_and_kill
 
 
@@ -41,7 +41,7 @@ def _auth_for_github() -> str:
     click.echo("> The minimum required scopes are 'repo' and 'read:org'.")
     github_token = click.prompt("\nPaste your Github Access Token here")
 
-    github = Github(github_token)
+    github = get_github(github_token)
     user = github.get_user()
     try:
         name = user.login
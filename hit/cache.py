@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+#
+# Copyright 2022 Graviti. Licensed under MIT License.
+#
+
+"""Implementation of hit cache."""
+
+from datetime import datetime
+from typing import Optional
+
+import click
+
+from hit.mirror import (
+    MirrorCache,
+    format_size,
+    get_mirror_cache_size,
+    mirror_cache_dirpath,
+    parse_size,
+)
+from hit.session import ResponseCache, http_cache_dirpath
+from hit.utility import fatal_and_kill
+
+
+def _implement_clear() -> None:
+    count = ResponseCache(http_cache_dirpath()).clear()
+    click.echo(f"Removed {count} cached Github API responses.")
+
+
+def _implement_show() -> None:
+    count, size = ResponseCache(http_cache_dirpath()).stat()
+    click.secho("> Github API responses:", bold=True)
+    click.echo(f"{count} responses, {format_size(size)} in '{http_cache_dirpath()}'\n")
+
+    size_limit = get_mirror_cache_size()
+    mirrors = MirrorCache(mirror_cache_dirpath(), size_limit).list()
+    total_size = sum(mirror.size for mirror in mirrors)
+    click.secho("> Repository mirrors:", bold=True)
+    click.echo(
+        f"{len(mirrors)} mirrors, {format_size(total_size)} of {format_size(size_limit)} "
+        f"in '{mirror_cache_dirpath()}'"
+    )
+    if not mirrors:
+        return
+
+    click.echo()
+    click.secho(f"{'LAST USED':<16}  {'SIZE':>10}  URL", bold=True)
+    for mirror in mirrors:
+        last_used = datetime.fromtimestamp(mirror.last_used).strftime("%Y-%m-%d %H:%M")
+        click.echo(f"{last_used:<16}  {format_size(mirror.size):>10}  {mirror.url}")
+
+
+def _implement_prune(size: Optional[str]) -> None:
+    if size is None:
+        size_limit = get_mirror_cache_size()
+    else:
+        parsed_size = parse_size(size)
+        if parsed_size is None:
+            fatal_and_kill(f"Invalid size: '{size}'!")
+        size_limit = parsed_size
+
+    evicted = MirrorCache(mirror_cache_dirpath(), size_limit).prune(size_limit)
+    for mirror in evicted:
+        click.echo(f"Removed mirror: {mirror.url} ({format_size(mirror.size)})")
+
+    click.echo(
+        f"Removed {len(evicted)} mirrors, "
+        f"{format_size(sum(mirror.size for mirror in evicted))} freed."
+    )
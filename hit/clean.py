@@ -6,16 +6,38 @@
 """Implementation of hit clean."""
 
 import sys
-from subprocess import CalledProcessError
-from typing import Optional
+from subprocess import DEVNULL, CalledProcessError
+from typing import List, Optional
 
-from hit.utility import clean_branch, fatal_and_kill, get_base_branch, get_current_branch
+import click
 
+from hit.graphql import PullRequestState, get_pull_request_states
+from hit.objects import get_object_reader
+from hit.utility import (
+    ENV,
+    clean_branch,
+    clean_branches,
+    fatal_and_kill,
+    get_base_branch,
+    get_current_branch,
+    get_repo_names,
+    get_repo_state,
+    read_config,
+    run,
+)
 
-def _implement_clean(branch: Optional[str], yes: bool) -> None:
+
+def _implement_clean(branch: Optional[str], yes: bool, merged: bool) -> None:
     try:
         current_branch = get_current_branch()
         base = get_base_branch()
+        if merged:
+            if branch:
+                fatal_and_kill("Do not specify the branch name with '--merged'!")
+
+            _clean_merged_branches(current_branch, base, yes)
+            return
+
         target_branch = branch if branch else current_branch
         if target_branch == base:
             fatal_and_kill(f"Do not execute 'hit clean' for base branch ({base})!")
@@ -24,3 +46,48 @@ def _implement_clean(branch: Optional[str], yes: bool) -> None:
 
     except CalledProcessError:
         sys.exit(1)
+
+
+def _clean_merged_branches(current_branch: str, base: str, yes: bool) -> None:
+    branches = [branch for branch in get_repo_state().upstreams if branch != base]
+    if not branches:
+        click.echo("No branch needs to be cleaned.")
+        return
+
+    origin_name, upstream_name = get_repo_names()
+    states = get_pull_request_states(
+        read_config()["github"]["token"], upstream_name, origin_name, branches
+    )
+
+    landed_branches = [
+        branch for branch, pull_states in states.items() if _is_landed(branch, pull_states)
+    ]
+    if not landed_branches:
+        click.echo("No branch with merged or closed pull requests found.")
+        return
+
+    clean_branches(landed_branches, base if current_branch in landed_branches else None, yes)
+
+
+def _is_landed(branch: str, pull_states: List[PullRequestState]) -> bool:
+    if not pull_states or any(pull_state.state == "OPEN" for pull_state in pull_states):
+        return False
+
+    # The branch name may have been reused after its pull request was landed, so the branch is
+    # only landed when the head of one of its pull requests contains the local branch tip.
+    tip = get_object_reader().read_commit(f"refs/heads/{branch}").sha
+    return any(_contains(pull_state.head_sha, tip) for pull_state in pull_states)
+
+
+def _contains(head: str, sha: str) -> bool:
+    if head == sha:
+        return True
+
+    result = run(
+        ["git", "merge-base", "--is-ancestor", sha, head],
+        env=ENV,
+        stdout=DEVNULL,
+        stderr=DEVNULL,
+        check=False,
+    )
+    return result.returncode == 0
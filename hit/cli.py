@@ -6,17 +6,74 @@
 
 """Graviti Github workflow CLI."""
 
-from typing import Optional
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 import click
 
 from hit import __version__
 
+if TYPE_CHECKING:
+    from click.shell_completion import CompletionItem
+
+    from hit.trace import Tracer
+
+_NETWORK_COMMANDS = {"clean", "clone", "land", "pull", "push"}
+
 
 @click.group(context_settings={"help_option_names": ("-h", "--help")})
 @click.version_option(__version__)
-def hit() -> None:
-    """Usage: 'hit' + COMMAND.\f"""  # noqa: D415, D301
+@click.option(
+    "--trace",
+    "trace_file",
+    type=click.Path(dir_okay=False, writable=True),
+    envvar="HIT_TRACE",
+    help="Write the Chrome trace-event json of git and Github API calls into the file.",
+)
+@click.pass_context
+def hit(ctx: click.Context, trace_file: Optional[str]) -> None:
+    """Usage: 'hit' + COMMAND.\f
+
+    Arguments:
+        ctx: The click context.
+        trace_file: The file to write the Chrome trace-event json into.
+
+    """  # noqa: D415, D301
+    if trace_file:
+        from hit.trace import start_tracing
+
+        tracer = start_tracing()
+        ctx.call_on_close(lambda: _finish_tracing(tracer, trace_file))
+
+    if ctx.invoked_subcommand in _NETWORK_COMMANDS:
+        from hit.utility import start_ssh_multiplexing, stop_ssh_multiplexing
+
+        control_dir = start_ssh_multiplexing()
+        if control_dir:
+            ctx.call_on_close(lambda: stop_ssh_multiplexing(control_dir))
+
+
+def _finish_tracing(tracer: "Tracer", trace_file: str) -> None:
+    tracer.dump(trace_file)
+
+    click.echo(f"\n{'TRACE':<50}{'COUNT':>8}{'TOTAL(ms)':>12}", err=True)
+    for name, count, total in tracer.summarize():
+        click.echo(f"{name[:49]:<50}{count:>8}{total:>12.1f}", err=True)
+
+
+def _complete_branches(
+    _: click.Context, __: click.Parameter, incomplete: str
+) -> List["CompletionItem"]:
+    from hit.completion import complete_branches
+
+    return complete_branches(incomplete)
+
+
+def _complete_repositories(
+    _: click.Context, __: click.Parameter, incomplete: str
+) -> List["CompletionItem"]:
+    from hit.completion import complete_repositories
+
+    return complete_repositories(incomplete)
 
 
 @hit.command()
@@ -28,75 +85,257 @@ def auth() -> None:
 
 
 @hit.command()
-@click.argument("repository", type=str)
+@click.argument("repository", type=str, shell_complete=_complete_repositories)
 @click.argument("directory", type=str, required=False)
-def clone(repository: str, directory: Optional[str]) -> None:
+@click.option(
+    "--filter", "filter_spec", help="Partial clone filter passed to git, like 'blob:none'."
+)
+@click.option("--depth", type=int, help="Create a shallow clone with the history truncated.")
+@click.option(
+    "--sparse",
+    multiple=True,
+    metavar="PATH",
+    help="Only check out the given paths with sparse checkout, can be used multiple times.",
+)
+@click.option(
+    "--prewarm-hooks",
+    is_flag=True,
+    help="Build the pre-commit hook environments in the background while setting up the repo.",
+)
+@click.option(
+    "--cache/--no-cache",
+    "use_cache",
+    default=True,
+    help="Borrow the objects from the local mirror of the repo, not used with --filter or --depth.",
+)
+def clone(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+    repository: str,
+    directory: Optional[str],
+    filter_spec: Optional[str],
+    depth: Optional[int],
+    sparse: Tuple[str, ...],
+    prewarm_hooks: bool,
+    use_cache: bool,
+) -> None:
     """Fork + clone + initialize the target github repo for hit CLI.\f
 
     Arguments:
         repository: The repository name needs to be forked and cloned
         directory: The newly created directory the repo needs to be cloned to
+        filter_spec: Partial clone filter passed to git, like 'blob:none'.
+        depth: Create a shallow clone with the history truncated.
+        sparse: Only check out the given paths with sparse checkout.
+        prewarm_hooks: Build the pre-commit hook environments in the background.
+        use_cache: Borrow the objects from the local mirror of the repo.
 
     """  # noqa: D415, D301
     from hit.clone import _implement_clone
 
-    _implement_clone(repository, directory)
+    _implement_clone(repository, directory, filter_spec, depth, sparse, prewarm_hooks, use_cache)
 
 
 @hit.command()
-def pull() -> None:
-    """Sync the local and remote develop repo with upstream repo.\f"""  # noqa: D415, D301
+@click.option(
+    "-a",
+    "--all",
+    "workspace",
+    type=click.Path(exists=True, file_okay=False),
+    help="Sync all the hit repos under the directory concurrently.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="The number of repos synced concurrently.",
+)
+def pull(workspace: Optional[str], jobs: int) -> None:
+    """Sync the local and remote develop repo with upstream repo.\f
+
+    Arguments:
+        workspace: Sync all the hit repos under the directory concurrently.
+        jobs: The number of repos synced concurrently.
+
+    """  # noqa: D415, D301
     from hit.pull import _implement_pull
 
-    _implement_pull()
+    _implement_pull(workspace, jobs)
 
 
 @hit.command()
 @click.option(
-    "-b", "--base", default="", help="The branch into which the code wanted to be merged."
+    "-b",
+    "--base",
+    default="",
+    shell_complete=_complete_branches,
+    help="The branch into which the code wanted to be merged.",
 )
 @click.option("-f", "--force", is_flag=True, help="Whether to git push with -f.")
-def push(base: str, force: bool) -> None:
+@click.option(
+    "-s",
+    "--stack",
+    is_flag=True,
+    help="Push every branch between HEAD and the base branch, origin must not be a fork.",
+)
+def push(base: str, force: bool, stack: bool) -> None:
     """Push the local branch to remote and create/update the pull request.\f
 
     Arguments:
         base: The branch into which the code wanted to be merged.
         force: Whether to git push with -f.
+        stack: Push every branch between HEAD and the base branch, origin must not be a fork.
 
     """  # noqa: D415, D301
     from hit.push import _implement_push
 
-    _implement_push(base, force)
+    _implement_push(base, force, stack)
 
 
 @hit.command()
 @click.option("-y", "--yes", is_flag=True, help="Run non-interactively with 'yes' to all prompts.")
-def land(yes: bool) -> None:
+@click.option("-w", "--wait", is_flag=True, help="Wait for all Checks to finish before merging.")
+@click.option(
+    "--timeout", default=1800, show_default=True, help="The max seconds to wait for the Checks."
+)
+@click.option(
+    "-s",
+    "--stack",
+    is_flag=True,
+    help="Land the whole stack of pull requests below the branch, origin must not be a fork.",
+)
+@click.option(
+    "-v", "--verbose", is_flag=True, help="Print the timings of the cleaning and updating steps."
+)
+def land(yes: bool, wait: bool, timeout: int, stack: bool, verbose: bool) -> None:
     """Merge the pull request then clean and sync repo.\f
 
     Arguments:
         yes: Run non-interactively with 'yes' to all prompts.
+        wait: Wait for all Checks to finish before merging.
+        timeout: The max seconds to wait for the Checks.
+        stack: Land the whole stack of pull requests below the branch, origin must not be a fork.
+        verbose: Print the timings of the cleaning and updating operations.
 
     """  # noqa: D415, D301
     from hit.land import _implement_land
 
-    _implement_land(yes)
+    _implement_land(yes, wait, timeout, stack, verbose)
 
 
 @hit.command()
-@click.argument("branch", type=str, required=False)
+@click.argument("branch", type=str, required=False, shell_complete=_complete_branches)
 @click.option("-y", "--yes", is_flag=True, help="Run non-interactively with 'yes' to all prompts.")
-def clean(branch: Optional[str], yes: bool) -> None:
+@click.option(
+    "-m",
+    "--merged",
+    is_flag=True,
+    help="Delete all branches whose pull requests are merged or closed.",
+)
+def clean(branch: Optional[str], yes: bool, merged: bool) -> None:
     """Detele useless local and remote develop branch.\f
 
     Arguments:
         branch: The branch name needs to be deleted
         yes: Run non-interactively with 'yes' to all prompts.
+        merged: Delete all branches whose pull requests are merged or closed.
 
     """  # noqa: D415, D301
     from hit.clean import _implement_clean
 
-    _implement_clean(branch, yes)
+    _implement_clean(branch, yes, merged)
+
+
+@hit.command()
+@click.option(
+    "-w", "--watch", is_flag=True, help="Keep refreshing the rows whose pull requests changed."
+)
+@click.option(
+    "-i",
+    "--interval",
+    type=click.IntRange(min=1),
+    default=30,
+    show_default=True,
+    help="Seconds between refreshes in watch mode.",
+)
+def status(watch: bool, interval: int) -> None:
+    """Show the pull requests, reviews and checks of all local branches.\f
+
+    Arguments:
+        watch: Keep refreshing the rows whose pull requests changed.
+        interval: Seconds between refreshes in watch mode.
+
+    """  # noqa: D415, D301
+    from hit.status import _implement_status
+
+    _implement_status(watch, interval)
+
+
+@hit.group()
+def cache() -> None:
+    """Manage the local cache of hit CLI.\f"""  # noqa: D415, D301
+
+
+@cache.command()
+def clear() -> None:
+    """Remove all the cached Github API responses.\f"""  # noqa: D415, D301
+    from hit.cache import _implement_clear
+
+    _implement_clear()
+
+
+@cache.command()
+def show() -> None:
+    """Show the cached Github API responses and repository mirrors.\f"""  # noqa: D415, D301
+    from hit.cache import _implement_show
+
+    _implement_show()
+
+
+@cache.command()
+@click.option(
+    "--size",
+    help="The max total size of the mirrors to keep, like '5G', '0' removes all the mirrors.",
+)
+def prune(size: Optional[str]) -> None:
+    """Remove the least recently used repository mirrors over the size limit.\f
+
+    Arguments:
+        size: The max total size of the mirrors to keep, the configured limit is used by default.
+
+    """  # noqa: D415, D301
+    from hit.cache import _implement_prune
+
+    _implement_prune(size)
+
+
+@hit.group()
+def daemon() -> None:
+    """Manage the background process which keeps hit CLI warm.\f"""  # noqa: D415, D301
+
+
+@daemon.command()
+def start() -> None:
+    """Start hit daemon, then 'hit' commands are executed by it.\f"""  # noqa: D415, D301
+    from hit.daemon import _implement_start
+
+    _implement_start()
+
+
+@daemon.command()
+def stop() -> None:
+    """Stop the running hit daemon.\f"""  # noqa: D415, D301
+    from hit.daemon import _implement_stop
+
+    _implement_stop()
+
+
+@daemon.command("status")
+def daemon_status() -> None:
+    """Show whether hit daemon is running.\f"""  # noqa: D415, D301
+    from hit.daemon import _implement_status
+
+    _implement_status()
 
 
 @hit.group(hidden=True)
@@ -135,4 +374,4 @@ def append(url: str, file: str) -> None:
 
 
 if __name__ == "__main__":
-    hit()
+    hit()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+#
+# Copyright 2022 Graviti. Licensed under MIT License.
+#
+
+"""The thin client of hit daemon.
+
+The module only depends on the standard library. When 'hit daemon' is running, the 'hit' entry
+point forwards the arguments, the working directory, the environment and the stdio file
+descriptors to it, so the command skips the interpreter startup and the import of PyGithub.
+Otherwise the command is executed in process.
+
+The command forked by the daemon has no controlling terminal, so the ssh and git prompts, which
+open '/dev/tty', cannot work in it. The commands whose stdin is a terminal are executed in process,
+except the shell completion, which never prompts.
+
+"""
+
+import json
+import os
+import signal
+import socket
+import stat
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from hit import __version__
+
+_HEADER = struct.Struct("!I")
+_STATUS = struct.Struct("!i")
+_STDIO = (0, 1, 2)
+
+VERSION_MISMATCH = -1
+
+
+def socket_path() -> str:
+    """Get path of the Unix socket of hit daemon.
+
+    Returns:
+        The path of the Unix socket, which is private to the current user.
+
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if not runtime_dir:
+        runtime_dir = os.path.join(tempfile.gettempdir(), f"hit-{os.getuid()}")
+
+    return os.path.join(runtime_dir, "hit-daemon.sock")
+
+
+def is_private(path: str) -> bool:
+    """Check whether the path is owned by the current user and inaccessible to other users.
+
+    The fallback socket directory is in the shared temp directory, so it may have been created by
+    another user to receive the environment and the stdio of the commands.
+
+    Arguments:
+        path: The path of the directory or the socket.
+
+    Returns:
+        Whether the path is private to the current user.
+
+    """
+    try:
+        status = os.lstat(path)
+    except OSError:
+        return False
+
+    return (
+        not stat.S_ISLNK(status.st_mode)
+        and status.st_uid == os.getuid()
+        and not status.st_mode & (stat.S_IRWXG | stat.S_IRWXO)
+    )
+
+
+def connect() -> Optional[socket.socket]:
+    """Connect to the running hit daemon.
+
+    Returns:
+        The connected socket, None if the daemon is not running or its socket is not private.
+
+    """
+    path = socket_path()
+    if not (is_private(os.path.dirname(path)) and is_private(path)):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+
+    return sock
+
+
+def send_request(sock: socket.socket, request: Dict[str, Any], fds: Tuple[int, ...] = ()) -> None:
+    """Send a request with the file descriptors to the daemon.
+
+    Arguments:
+        sock: The connected socket.
+        request: The json serializable request.
+        fds: The file descriptors sent along with the request.
+
+    """
+    payload = json.dumps(request).encode()
+    ancillary = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array("i", fds))] if fds else []
+    sock.sendmsg([_HEADER.pack(len(payload))], ancillary)
+    sock.sendall(payload)
+
+
+def receive_request(sock: socket.socket) -> Tuple[Dict[str, Any], List[int]]:
+    """Receive a request with the file descriptors from the client.
+
+    Arguments:
+        sock: The connected socket.
+
+    Raises:
+        ConnectionError: When the connection is closed before the request is received.
+
+    Returns:
+        The request and the received file descriptors.
+
+    """
+    fds = array("i")
+    data, ancillary, _, _ = sock.recvmsg(_HEADER.size, socket.CMSG_LEN(len(_STDIO) * fds.itemsize))
+    for level, kind, cmsg_data in ancillary:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(cmsg_data[: len(cmsg_data) - len(cmsg_data) % fds.itemsize])
+
+    if len(data) < _HEADER.size:
+        raise ConnectionError("Incomplete request header")
+
+    (length,) = _HEADER.unpack(data)
+    payload = b""
+    while len(payload) < length:
+        chunk = sock.recv(length - len(payload))
+        if not chunk:
+            raise ConnectionError("Incomplete request payload")
+        payload += chunk
+
+    return json.loads(payload), fds.tolist()
+
+
+def receive_status(sock: socket.socket) -> Optional[int]:
+    """Receive a status integer from the other side.
+
+    Arguments:
+        sock: The connected socket.
+
+    Returns:
+        The received status, None if the connection is closed.
+
+    """
+    data = b""
+    while len(data) < _STATUS.size:
+        chunk = sock.recv(_STATUS.size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+
+    return _STATUS.unpack(data)[0]  # type: ignore[no-any-return]
+
+
+def send_status(sock: socket.socket, status: int) -> None:
+    """Send a status integer to the other side.
+
+    Arguments:
+        sock: The connected socket.
+        status: The status to send.
+
+    """
+    sock.sendall(_STATUS.pack(status))
+
+
+def _run_in_daemon(args: Any) -> Optional[int]:
+    sock = connect()
+    if sock is None:
+        return None
+
+    with sock:
+        try:
+            send_request(
+                sock,
+                {
+                    "command": "run",
+                    "version": __version__,
+                    "args": args,
+                    "cwd": os.getcwd(),
+                    "env": dict(os.environ),
+                },
+                _STDIO,
+            )
+            pid = receive_status(sock)
+        except OSError:
+            return None
+
+        if pid is None or pid == VERSION_MISMATCH:
+            return None
+
+        # The command leads its own process group, so its git and ssh processes get the signals.
+        def _forward(signum: int, _: Any) -> None:
+            os.killpg(pid, signum)  # type: ignore[arg-type]
+
+        for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+            signal.signal(signum, _forward)
+
+        status = receive_status(sock)
+        return 1 if status is None else status
+
+
+def main() -> None:
+    """The entry point of hit CLI, run the command in hit daemon if it is running."""
+    if (
+        os.name == "posix"
+        and not os.environ.get("HIT_NO_DAEMON")
+        and (not sys.stdin.isatty() or "_HIT_COMPLETE" in os.environ)
+    ):
+        status = _run_in_daemon(sys.argv[1:])
+        if status is not None:
+            sys.exit(status)
+
+    from hit.cli import hit  # pylint: disable=import-outside-toplevel
+
+    hit()  # pylint: disable=no-value-for-parameter
+
+
+if __name__ == "__main__":
+    main()
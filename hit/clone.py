@@ -5,66 +5,286 @@
 
 """Implementation of hit clone."""
 
+import multiprocessing
 import os
 import sys
-from subprocess import CalledProcessError, run
-from typing import Any, Dict, List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from importlib.util import find_spec
+from subprocess import DEVNULL, CalledProcessError
+from threading import Lock
+from time import monotonic, sleep
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 import click
-from github import Github
+from github import Repository
 from github.GithubException import UnknownObjectException
 
-from hit.utility import ENV, fatal_and_kill, read_config, set_base_branch
+from hit.completion import record_repository
+from hit.mirror import MirrorCache, get_mirror_cache_size, mirror_cache_dirpath
+from hit.session import get_github
+from hit.utility import ENV, fatal_and_kill, read_config, run, set_base_branch, warning
 
 _PRECOMMIT_CONFIG_PATH = ".pre-commit-config.yaml"
+_MIN_FORK_POLL_INTERVAL = 1
+_MAX_FORK_POLL_INTERVAL = 16
+_FORK_TIMEOUT = 300
+_MAX_HOOK_WORKERS = 4
+_PROGRESS_INTERVAL = 0.5
 
 
-def _implement_clone(repository: str, directory: Optional[str]) -> None:
+class _HookEnvironmentBuilder:
+    """The builder of the pre-commit hook environments, which runs in the background.
+
+    The hook repos are cloned by pre-commit one by one under its store lock, then the missing
+    environments are installed concurrently by a process pool while the lock is held.
+
+    """
+
+    def __init__(self) -> None:
+        self.total = 0
+        self.built = 0
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._future: Optional["Future[None]"] = None
+        self._cancelled = False
+
+    def start(self) -> None:
+        """Start building the hook environments in the background."""
+        if os.path.exists(_PRECOMMIT_CONFIG_PATH) and find_spec("pre_commit"):
+            self._future = self._executor.submit(self._build)
+
+    def wait(self) -> None:
+        """Wait for the hook environments to be built, print the progress while waiting."""
+        if self._future is None:
+            return
+
+        click.secho("> Building 'pre-commit' hook environments:", bold=True)
+        progress = ""
+        while not wait([self._future], timeout=_PROGRESS_INTERVAL).done:
+            if progress != f"{self.built}/{self.total}":
+                progress = f"{self.built}/{self.total}"
+                click.echo(f"\r{progress} built", nl=False)
+
+        try:
+            self._future.result()
+        except (Exception, SystemExit):  # pylint: disable=broad-except
+            click.echo()
+            warning("Building the hook environments failed, they will be built on first commit.")
+        else:
+            click.echo(f"\r{self.built}/{self.total} built")
+
+        self._executor.shutdown()
+        click.echo()
+
+    def cancel(self) -> None:
+        """Stop building the hook environments.
+
+        The builder thread is not a daemon thread, so the exit of the interpreter waits for the
+        environment being installed, then the other installing processes are terminated. The
+        incomplete environments are cleaned up by pre-commit before they are installed again.
+
+        """
+        self._cancelled = True
+        if self._future is not None:
+            self._future.cancel()
+        self._executor.shutdown(wait=False)
+
+    def _build(self) -> None:
+        # pylint: disable=import-outside-toplevel
+        from pre_commit.clientlib import load_config
+        from pre_commit.repository import all_hooks
+        from pre_commit.store import Store
+
+        store = Store()
+        hooks = all_hooks(load_config(_PRECOMMIT_CONFIG_PATH), store)
+        try:
+            from pre_commit.repository import _hook_install, _hook_installed
+        except ImportError:
+            # The concurrent install relies on the private helpers of pre-commit, fall back to its
+            # sequential install when they are not available.
+            from pre_commit.repository import install_hook_envs
+
+            self.total = len({hook.install_key for hook in hooks})
+            install_hook_envs(hooks, store)
+            self.built = self.total
+            return
+
+        with store.exclusive_lock():
+            pending = {}
+            for hook in hooks:
+                if hook.install_key not in pending and not _hook_installed(hook):
+                    pending[hook.install_key] = hook
+            self.total = len(pending)
+
+            if not pending:
+                return
+
+            # The language installers of pre-commit modify 'os.environ' while installing, so the
+            # environments are installed in separate processes instead of threads.
+            context = multiprocessing.get_context("spawn")
+            with context.Pool(min(_MAX_HOOK_WORKERS, len(pending))) as pool:
+                for _ in pool.imap_unordered(_hook_install, pending.values()):
+                    if self._cancelled:
+                        break
+                    with self._lock:
+                        self.built += 1
+
+
+def _implement_clone(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+    repository: str,
+    directory: Optional[str],
+    filter_spec: Optional[str],
+    depth: Optional[int],
+    sparse: Tuple[str, ...],
+    prewarm_hooks: bool,
+    use_cache: bool,
+) -> None:
     token = read_config()["github"]["token"]
-    github = Github(token)
+    github = get_github(token)
     name = _get_repo_name(repository)
     try:
         origin_repo = github.get_repo(name)
     except UnknownObjectException:
         fatal_and_kill(f"Repository '{name}' not found!")
 
-    click.secho("> Forking:", bold=True)
-
-    if origin_repo.visibility == "private":
-        click.secho(f"Repository '{name}' is private, skip the fork process.\n")
-        target_repo = origin_repo
-    else:
-        target_repo = origin_repo.create_fork()
-
-        click.echo(f"Repository forked: {click.style(target_repo.full_name, bold=True)}\n")
+    clone_command = ["git", "clone"]
+    if filter_spec:
+        clone_command += ("--filter", filter_spec)
+    if depth:
+        clone_command += ("--depth", str(depth))
+    if sparse:
+        clone_command.append("--sparse")
 
     directory = directory if directory else name.split("/", 1)[1]
+    builder = _HookEnvironmentBuilder()
+    on_cloned = builder.start if prewarm_hooks else lambda: None
     try:
-        click.secho("> Cloning:", bold=True)
-        run(["git", "clone", target_repo.ssh_url, directory], env=ENV, check=True)
+        # The mirror has the full history, which is not wanted by a partial or shallow clone.
+        with _borrow_mirror(
+            origin_repo.ssh_url, use_cache and not filter_spec and not depth
+        ) as mirror_path:
+            if mirror_path:
+                clone_command += ("--reference", mirror_path, "--dissociate")
 
-        os.chdir(directory)
+            if origin_repo.visibility == "private":
+                _clone_without_fork(origin_repo, clone_command, directory, on_cloned)
+            else:
+                _clone_with_fork(origin_repo, clone_command, directory, on_cloned)
 
-        click.secho("\n> Setting upstream:", bold=True)
-        run(["git", "remote", "add", "upstream", origin_repo.ssh_url], env=ENV, check=True)
         run(
             ["git", "config", "--local", "remote.upstream.gh-resolved", "base"], env=ENV, check=True
         )
         click.echo(f"Remote added: {click.style(origin_repo.ssh_url, underline=True)}")
 
+        if sparse:
+            click.secho("\n> Setting sparse checkout:", bold=True)
+            run(["git", "sparse-checkout", "set", *sparse], env=ENV, check=True)
+
         click.secho("\n> Setting base branch:", bold=True)
         set_base_branch(origin_repo.default_branch)
         click.echo(f"Base branch set: {click.style(origin_repo.default_branch, underline=True)}\n")
 
+        record_repository(origin_repo.full_name)
+
+        if os.path.exists(_PRECOMMIT_CONFIG_PATH):
+            click.secho("> Installing 'pre-commit' scripts:", bold=True)
+            _install_precommit_scripts()
+            click.echo()
+
+        builder.wait()
+
     except CalledProcessError:
         sys.exit(1)
+    finally:
+        # The builder is left running when the clone fails, e.g. the fork is not ready.
+        builder.cancel()
+
+    click.secho("> Success!", fg="green")
+
 
-    if os.path.exists(_PRECOMMIT_CONFIG_PATH):
-        click.secho("> Installing 'pre-commit' scripts:", bold=True)
-        _install_precommit_scripts()
+@contextmanager
+def _borrow_mirror(ssh_url: str, enabled: bool) -> Iterator[Optional[str]]:
+    if not enabled:
+        yield None
+        return
+
+    click.secho("> Updating mirror:", bold=True)
+    with MirrorCache(mirror_cache_dirpath(), get_mirror_cache_size()).borrow(ssh_url) as path:
+        if path:
+            click.echo(f"Mirror updated: {click.style(path, underline=True)}")
         click.echo()
+        yield path
 
-    click.secho("> Success!", fg="green")
+
+def _clone_without_fork(
+    origin_repo: Repository.Repository,
+    clone_command: List[str],
+    directory: str,
+    on_cloned: Callable[[], None],
+) -> None:
+    click.secho("> Forking:", bold=True)
+    click.secho(f"Repository '{origin_repo.full_name}' is private, skip the fork process.\n")
+
+    click.secho("> Cloning:", bold=True)
+    run(clone_command + [origin_repo.ssh_url, directory], env=ENV, check=True)
+    os.chdir(directory)
+    on_cloned()
+
+    click.secho("\n> Setting upstream:", bold=True)
+    run(["git", "remote", "add", "upstream", origin_repo.ssh_url], env=ENV, check=True)
+
+
+def _clone_with_fork(
+    origin_repo: Repository.Repository,
+    clone_command: List[str],
+    directory: str,
+    on_cloned: Callable[[], None],
+) -> None:
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        fork_future = executor.submit(origin_repo.create_fork)
+
+        click.secho("> Cloning:", bold=True)
+        run(
+            clone_command + ["--origin", "upstream", origin_repo.ssh_url, directory],
+            env=ENV,
+            check=True,
+        )
+        os.chdir(directory)
+        on_cloned()
+
+        target_repo = fork_future.result()
+
+    click.secho("\n> Forking:", bold=True)
+    _wait_for_fork(target_repo.ssh_url)
+    click.echo(f"Repository forked: {click.style(target_repo.full_name, bold=True)}\n")
+
+    click.secho("> Setting origin:", bold=True)
+    run(["git", "remote", "add", "origin", target_repo.ssh_url], env=ENV, check=True)
+    run(["git", "fetch", "origin"], env=ENV, check=True)
+    run(
+        ["git", "branch", f"--set-upstream-to=origin/{origin_repo.default_branch}"],
+        env=ENV,
+        check=True,
+    )
+    click.echo(f"Remote added: {click.style(target_repo.ssh_url, underline=True)}")
+
+    click.secho("\n> Setting upstream:", bold=True)
+
+
+def _wait_for_fork(ssh_url: str) -> None:
+    interval = _MIN_FORK_POLL_INTERVAL
+    deadline = monotonic() + _FORK_TIMEOUT
+    while (
+        run(["git", "ls-remote", ssh_url, "HEAD"], env=ENV, stdout=DEVNULL, check=False).returncode
+        != 0
+    ):
+        if monotonic() + interval > deadline:
+            fatal_and_kill(f"The fork '{ssh_url}' is not ready after {_FORK_TIMEOUT} seconds!")
+
+        click.echo(f"Waiting {interval} seconds for the fork to be ready...")
+        sleep(interval)
+        interval = min(interval * 2, _MAX_FORK_POLL_INTERVAL)
 
 
 def _get_repo_name(repository: str) -> str:
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+#
+# Copyright 2022 Graviti. Licensed under MIT License.
+#
+
+"""Shell completion sources of hit CLI.
+
+The completions are served from the local git repo and the local index of repositories, so the
+completion never sends a Github request or imports the command implementations.
+
+"""
+
+import os
+from subprocess import DEVNULL, PIPE
+from tempfile import NamedTemporaryFile
+from typing import Dict, List
+
+from click.shell_completion import CompletionItem
+
+from hit.utility import ENV, cache_dirpath, run
+
+_MAX_REPOSITORIES = 50
+_PULL_REQUEST_PREFIX = "branch."
+_PULL_REQUEST_SUFFIX = ".hitpullrequest"
+
+
+def _repositories_filepath() -> str:
+    return os.path.join(cache_dirpath(), "repositories")
+
+
+def record_repository(name: str) -> None:
+    """Move the repository to the top of the index of recently used repositories.
+
+    Arguments:
+        name: The full name of the repository, like 'Graviti-AI/hit-cli'.
+
+    """
+    names = [name] + [item for item in _read_repositories() if item != name]
+
+    path = _repositories_filepath()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with NamedTemporaryFile(
+        "w", dir=os.path.dirname(path), suffix=".tmp", delete=False, encoding="utf-8"
+    ) as fp:
+        fp.write("".join(f"{item}\n" for item in names[:_MAX_REPOSITORIES]))
+
+    os.replace(fp.name, path)
+
+
+def complete_repositories(incomplete: str) -> List[CompletionItem]:
+    """Complete the recently used repositories.
+
+    Arguments:
+        incomplete: The incomplete value typed by the user.
+
+    Returns:
+        The matched repositories, the most recently used first.
+
+    """
+    return [
+        CompletionItem(name)
+        for name in _read_repositories()
+        if name.startswith(incomplete) or name.split("/", 1)[-1].startswith(incomplete)
+    ]
+
+
+def complete_branches(incomplete: str) -> List[CompletionItem]:
+    """Complete the local branches, the cached pull request numbers are shown as help.
+
+    Arguments:
+        incomplete: The incomplete value typed by the user.
+
+    Returns:
+        The matched local branches.
+
+    """
+    result = _run_git("for-each-ref", "--format=%(refname:short)", "refs/heads")
+    branches = [branch for branch in result.split("\n") if branch and branch.startswith(incomplete)]
+    pull_requests = _get_pull_request_numbers()
+    return [
+        CompletionItem(
+            branch, help=f"#{pull_requests[branch]}" if branch in pull_requests else None
+        )
+        for branch in branches
+    ]
+
+
+def _get_pull_request_numbers() -> Dict[str, str]:
+    result = _run_git("config", "--local", "-z", "--get-regexp", r"^branch\..*\.hitpullrequest$")
+    numbers = {}
+    for item in result.split("\0"):
+        key, _, value = item.partition("\n")
+        if key:
+            numbers[key[len(_PULL_REQUEST_PREFIX) : -len(_PULL_REQUEST_SUFFIX)]] = value
+
+    return numbers
+
+
+def _read_repositories() -> List[str]:
+    try:
+        with open(_repositories_filepath(), encoding="utf-8") as fp:
+            return fp.read().split()
+    except FileNotFoundError:
+        return []
+
+
+def _run_git(*args: str) -> str:
+    result = run(["git", *args], env=ENV, stdout=PIPE, stderr=DEVNULL, check=False)
+    return result.stdout.decode() if result.returncode == 0 else ""
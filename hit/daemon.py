@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+#
+# Copyright 2022 Graviti. Licensed under MIT License.
+#
+
+"""Implementation of hit daemon.
+
+The daemon imports the heavy dependencies once, then forks a child for each command forwarded by
+'hit.client'. The child takes over the stdio, the working directory and the environment of the
+client, so every command still runs in a fresh process state.
+
+"""
+
+import importlib
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from typing import Any, Dict, List, NoReturn, Optional
+
+import click
+
+from hit import __version__
+from hit.client import (
+    VERSION_MISMATCH,
+    connect,
+    is_private,
+    receive_request,
+    receive_status,
+    send_request,
+    send_status,
+    socket_path,
+)
+from hit.utility import cache_dirpath, fatal_and_kill, reload_env
+
+# The environment read by hit modules at import time is rebuilt in the child by 'reload_env'.
+_PRELOADED_MODULES = ("github", "requests", "urllib3", "hit.cli")
+_START_TIMEOUT = 10
+_STOP_TIMEOUT = 10
+
+
+def _implement_start() -> None:
+    if os.name != "posix":
+        fatal_and_kill("'hit daemon' is only supported on POSIX systems!")
+
+    pid = _ping()
+    if pid is not None:
+        click.echo(f"hit daemon is already running (pid {pid}).")
+        return
+
+    path = socket_path()
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    if not is_private(os.path.dirname(path)):
+        fatal_and_kill(f"'{os.path.dirname(path)}' must be private to the current user!")
+    os.makedirs(cache_dirpath(), exist_ok=True)
+    log_path = os.path.join(cache_dirpath(), "daemon.log")
+
+    child = os.fork()
+    if child == 0:
+        os.setsid()
+        if os.fork() == 0:
+            _detach(log_path)
+            _serve(path)
+        os._exit(0)  # pylint: disable=protected-access
+
+    os.waitpid(child, 0)
+
+    deadline = time.monotonic() + _START_TIMEOUT
+    while time.monotonic() < deadline:
+        pid = _ping()
+        if pid is not None:
+            click.echo(f"hit daemon started (pid {pid}), listening on '{path}'.")
+            return
+        time.sleep(0.05)
+
+    fatal_and_kill(f"hit daemon failed to start, see '{log_path}' for details.")
+
+
+def _implement_stop() -> None:
+    sock = connect()
+    if sock is None:
+        click.echo("hit daemon is not running.")
+        return
+
+    with sock:
+        send_request(sock, {"command": "stop"})
+        pid = receive_status(sock)
+
+    deadline = time.monotonic() + _STOP_TIMEOUT
+    while _ping() is not None:
+        if time.monotonic() > deadline:
+            fatal_and_kill(f"hit daemon (pid {pid}) did not stop in {_STOP_TIMEOUT} seconds!")
+        time.sleep(0.05)
+
+    click.echo(f"hit daemon (pid {pid}) stopped.")
+
+
+def _implement_status() -> None:
+    pid = _ping()
+    if pid is None:
+        click.echo("hit daemon is not running.")
+    else:
+        click.echo(f"hit daemon is running (pid {pid}), listening on '{socket_path()}'.")
+
+
+def _ping() -> Optional[int]:
+    sock = connect()
+    if sock is None:
+        return None
+
+    with sock:
+        try:
+            send_request(sock, {"command": "ping"})
+            return receive_status(sock)
+        except OSError:
+            return None
+
+
+def _detach(log_path: str) -> None:
+    os.chdir("/")
+    null_fd = os.open(os.devnull, os.O_RDONLY)
+    log_fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+    os.dup2(null_fd, 0)
+    os.dup2(log_fd, 1)
+    os.dup2(log_fd, 2)
+    os.close(null_fd)
+    os.close(log_fd)
+
+
+def _serve(path: str) -> NoReturn:
+    for name in _PRELOADED_MODULES:
+        importlib.import_module(name)
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+    server.listen(16)
+
+    # The forked children are reaped by the kernel.
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"hit daemon {__version__} (pid {os.getpid()}) listening on '{path}'", flush=True)
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    if not _handle(server, conn):
+                        break
+                except (OSError, ValueError):
+                    traceback.print_exc()
+    finally:
+        server.close()
+        os.remove(path)
+
+    os._exit(0)  # pylint: disable=protected-access
+
+
+def _handle(server: socket.socket, conn: socket.socket) -> bool:
+    request, fds = receive_request(conn)
+    try:
+        command = request.get("command")
+        if command == "ping":
+            send_status(conn, os.getpid())
+        elif command == "stop":
+            send_status(conn, os.getpid())
+            return False
+        elif command == "run":
+            if request.get("version") != __version__:
+                send_status(conn, VERSION_MISMATCH)
+            elif os.fork() == 0:
+                server.close()
+                _run_command(conn, request, fds)
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+    return True
+
+
+def _run_command(conn: socket.socket, request: Dict[str, Any], fds: List[int]) -> NoReturn:
+    status = 1
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        # The client forwards the signals to the process group led by the command.
+        os.setsid()
+        send_status(conn, os.getpid())
+
+        for fd, target in zip(fds, (0, 1, 2)):
+            os.dup2(fd, target)
+        sys.stdin = _reopen(sys.stdin, 0, "r", -1)
+        sys.stdout = _reopen(sys.stdout, 1, "w", 1 if os.isatty(1) else -1)
+        sys.stderr = _reopen(sys.stderr, 2, "w", 1)
+
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        reload_env()
+        sys.argv = ["hit", *request["args"]]
+
+        from hit.cli import hit  # pylint: disable=import-outside-toplevel
+
+        hit.main(args=request["args"], prog_name="hit")
+    except SystemExit as error:
+        status = _get_exit_status(error.code)
+    except BaseException:  # pylint: disable=broad-except
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        try:
+            send_status(conn, status)
+        except OSError:
+            pass
+
+    os._exit(status)  # pylint: disable=protected-access
+
+
+def _reopen(stream: Any, fd: int, mode: str, buffering: int) -> Any:
+    return open(  # pylint: disable=consider-using-with
+        fd, mode, buffering, encoding=stream.encoding, errors=stream.errors, closefd=False
+    )
+
+
+def _get_exit_status(code: Any) -> int:
+    if code is None:
+        return 0
+
+    if isinstance(code, int):
+        return code
+
+    print(code, file=sys.stderr)
+    return 1
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+#
+# Copyright 2022 Graviti. Licensed under MIT License.
+#
+
+"""Github GraphQL API client of hit CLI."""
+
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from hit.session import get_session
+from hit.utility import fatal, fatal_and_kill
+
+_GRAPHQL_URL = "https://api.github.com/graphql"
+_TIMEOUT = 15
+_MAX_BRANCHES_PER_QUERY = 50
+
+_PULL_REQUEST_FRAGMENT = """
+fragment PullRequestFields on PullRequest {
+  number
+  url
+  title
+  body
+  headRefName
+  baseRefName
+  baseRepository { nameWithOwner }
+  isDraft
+  mergeable
+  reviewDecision
+  headRepositoryOwner { login }
+  firstCommit: commits(first: 1) { nodes { commit { oid } } }
+  lastCommit: commits(last: 1) {
+    totalCount
+    nodes { commit { oid checkSuites(first: 100) { nodes { status conclusion } } } }
+  }
+}
+"""
+
+_PULL_REQUESTS_FIELD = """
+  branch{index}: ref(qualifiedName: $branch{index}) {{
+    associatedPullRequests(states: OPEN, first: 10) {{
+      nodes {{ ...PullRequestFields }}
+    }}
+  }}
+"""
+
+_PULL_REQUEST_STATES_FIELD = """
+  branch{index}: ref(qualifiedName: $branch{index}) {{
+    associatedPullRequests(first: 10, orderBy: {{field: CREATED_AT, direction: DESC}}) {{
+      nodes {{ state headRefOid baseRepository {{ nameWithOwner }} }}
+    }}
+  }}
+"""
+
+_DELETED_BRANCH_STATES_FIELD = """
+  branch{index}: pullRequests(
+    headRefName: $branch{index}, first: 100, orderBy: {{field: CREATED_AT, direction: DESC}}
+  ) {{
+    nodes {{ state headRefOid headRepositoryOwner {{ login }} }}
+  }}
+"""
+
+
+class PullRequestInfo(NamedTuple):
+    """The information of a pull request fetched by one GraphQL query.
+
+    Attributes:
+        number: The number of the pull request.
+        url: The html url of the pull request.
+        title: The title of the pull request.
+        body: The body of the pull request, None if it is empty.
+        head_branch: The name of the head branch.
+        base_branch: The name of the base branch.
+        first_sha: The sha of the first commit in the pull request.
+        head_sha: The sha of the head commit in the pull request.
+        commit_count: The number of commits in the pull request.
+        check_suites: The (status, conclusion) pairs of the check suites of the head commit.
+        is_draft: Whether the pull request is a draft.
+        mergeable: The mergeable state, like 'mergeable', 'conflicting' and 'unknown'.
+        review_decision: The review decision, like 'approved', None if no review is required.
+
+    """
+
+    number: int
+    url: str
+    title: str
+    body: Optional[str]
+    head_branch: str
+    base_branch: str
+    first_sha: str
+    head_sha: str
+    commit_count: int
+    check_suites: List[Tuple[str, Optional[str]]]
+    is_draft: bool
+    mergeable: str
+    review_decision: Optional[str]
+
+
+class PullRequestState(NamedTuple):
+    """The state of a pull request fetched by one GraphQL query.
+
+    Attributes:
+        state: The state of the pull request, like 'OPEN', 'MERGED' and 'CLOSED'.
+        head_sha: The sha of the head commit in the pull request.
+
+    """
+
+    state: str
+    head_sha: str
+
+
+def graphql_query(token: str, query: str, **variables: Any) -> Dict[str, Any]:
+    """Send a query to the Github GraphQL API.
+
+    Arguments:
+        token: The Github Access Token.
+        query: The GraphQL query string.
+        variables: The variables of the query.
+
+    Returns:
+        The data of the query result.
+
+    """
+    response = get_session().post(
+        _GRAPHQL_URL,
+        json={"query": query, "variables": variables},
+        headers={"Authorization": f"bearer {token}"},
+        timeout=_TIMEOUT,
+    )
+    if response.status_code == 401:
+        fatal_and_kill("Invalid Github Token!")
+
+    response.raise_for_status()
+    result: Dict[str, Any] = response.json()
+
+    errors = result.get("errors")
+    if errors:
+        for error in errors:
+            fatal(error["message"])
+
+        sys.exit(1)
+
+    return result["data"]  # type: ignore[no-any-return]
+
+
+def get_pull_requests(
+    token: str, upstream_name: str, origin_name: str, branch: str
+) -> List[PullRequestInfo]:
+    """Get the open pull requests whose head is the given branch with one GraphQL query.
+
+    Arguments:
+        token: The Github Access Token.
+        upstream_name: The full name of the upstream repo.
+        origin_name: The full name of the head repo.
+        branch: The name of the head branch.
+
+    Returns:
+        The information of the matched pull requests.
+
+    """
+    return get_open_pull_requests(token, upstream_name, origin_name, [branch])[branch]
+
+
+def get_open_pull_requests(
+    token: str, upstream_name: str, origin_name: str, branches: List[str]
+) -> Dict[str, List[PullRequestInfo]]:
+    """Get the open pull requests of all the given branches with batched GraphQL queries.
+
+    The pull requests are queried from the branches of the head repo, so they are not mixed up
+    with the pull requests from the same branch names of other forks. The branches are split into
+    several queries when there are too many of them.
+
+    Arguments:
+        token: The Github Access Token.
+        upstream_name: The full name of the upstream repo.
+        origin_name: The full name of the head repo.
+        branches: The names of the head branches.
+
+    Returns:
+        The mapping from branch names to the information of their open pull requests.
+
+    """
+    refs = _query_branches(
+        token,
+        origin_name,
+        _PULL_REQUESTS_FIELD,
+        [f"refs/heads/{branch}" for branch in branches],
+        _PULL_REQUEST_FRAGMENT,
+    )
+    return {
+        branch: (
+            _parse_pull_requests(ref["associatedPullRequests"]["nodes"], upstream_name)
+            if ref
+            else []
+        )
+        for branch, ref in zip(branches, refs)
+    }
+
+
+def get_pull_request_states(
+    token: str, upstream_name: str, origin_name: str, branches: List[str]
+) -> Dict[str, List[PullRequestState]]:
+    """Get the states of the pull requests of all the given branches with batched GraphQL queries.
+
+    The pull requests are queried from the branches of the head repo like
+    'get_open_pull_requests'. The head branches of the landed pull requests are usually deleted,
+    so the pull requests of the deleted branches are searched by the branch names in the upstream
+    repo instead.
+
+    Arguments:
+        token: The Github Access Token.
+        upstream_name: The full name of the upstream repo.
+        origin_name: The full name of the head repo.
+        branches: The names of the head branches.
+
+    Returns:
+        The mapping from branch names to the states of their pull requests.
+
+    """
+    refs = _query_branches(
+        token,
+        origin_name,
+        _PULL_REQUEST_STATES_FIELD,
+        [f"refs/heads/{branch}" for branch in branches],
+    )
+    states = {}
+    deleted_branches = []
+    for branch, ref in zip(branches, refs):
+        if ref is None:
+            deleted_branches.append(branch)
+            continue
+
+        states[branch] = [
+            PullRequestState(node["state"], node["headRefOid"])
+            for node in ref["associatedPullRequests"]["nodes"]
+            if node["baseRepository"]["nameWithOwner"].lower() == upstream_name.lower()
+        ]
+
+    origin_owner = origin_name.split("/", 1)[0].lower()
+    pull_requests = _query_branches(
+        token, upstream_name, _DELETED_BRANCH_STATES_FIELD, deleted_branches
+    )
+    for branch, connection in zip(deleted_branches, pull_requests):
+        states[branch] = [
+            PullRequestState(node["state"], node["headRefOid"])
+            for node in connection["nodes"]
+            if node["headRepositoryOwner"]
+            and node["headRepositoryOwner"]["login"].lower() == origin_owner
+        ]
+
+    return states
+
+
+def _query_branches(
+    token: str, repo_name: str, field: str, values: List[str], fragment: str = ""
+) -> List[Any]:
+    # The field is queried once for each value with aliases, split into several queries when
+    # there are too many values.
+    owner, name = repo_name.split("/", 1)
+    results: List[Any] = []
+    for offset in range(0, len(values), _MAX_BRANCHES_PER_QUERY):
+        chunk = values[offset : offset + _MAX_BRANCHES_PER_QUERY]
+        variables = ", ".join(f"$branch{index}: String!" for index in range(len(chunk)))
+        fields = "".join(field.format(index=index) for index in range(len(chunk)))
+        query = (
+            f"query($owner: String!, $name: String!, {variables}) {{\n"
+            f"repository(owner: $owner, name: $name) {{{fields}}}\n}}"
+        )
+        data = graphql_query(
+            token,
+            query + fragment,
+            owner=owner,
+            name=name,
+            **{f"branch{index}": value for index, value in enumerate(chunk)},
+        )
+        results.extend(data["repository"][f"branch{index}"] for index in range(len(chunk)))
+
+    return results
+
+
+def _parse_pull_requests(nodes: List[Dict[str, Any]], upstream_name: str) -> List[PullRequestInfo]:
+    pull_requests = []
+    for node in nodes:
+        if node["baseRepository"]["nameWithOwner"].lower() != upstream_name.lower():
+            continue
+
+        last_commit = node["lastCommit"]
+        head_commit = last_commit["nodes"][0]["commit"]
+        pull_requests.append(
+            PullRequestInfo(
+                number=node["number"],
+                url=node["url"],
+                title=node["title"],
+                body=node["body"] if node["body"] else None,
+                head_branch=node["headRefName"],
+                base_branch=node["baseRefName"],
+                first_sha=node["firstCommit"]["nodes"][0]["commit"]["oid"],
+                head_sha=head_commit["oid"],
+                commit_count=last_commit["totalCount"],
+                check_suites=[
+                    (suite["status"].lower(), suite["conclusion"] and suite["conclusion"].lower())
+                    for suite in head_commit["checkSuites"]["nodes"]
+                ],
+                is_draft=node["isDraft"],
+                mergeable=node["mergeable"].lower(),
+                review_decision=node["reviewDecision"] and node["reviewDecision"].lower(),
+            )
+        )
+
+    return pull_requests
@@ -6,112 +6,371 @@
 """Implementation of hit land."""
 
 import sys
-from subprocess import PIPE, CalledProcessError, run
-from time import sleep
+from concurrent.futures import Future, ThreadPoolExecutor
+from shlex import quote
+from subprocess import PIPE, STDOUT, CalledProcessError
+from threading import Lock
+from time import monotonic, sleep
+from typing import Callable, Dict, List, Optional, Tuple
 
 import click
-from github import Commit, Github, GithubException
-
+from github import GithubException, Repository
+
+import hit.message
+from hit.graphql import PullRequestInfo, get_open_pull_requests, get_pull_requests
+from hit.message import PR_CLOSED, clean_commit_message
+from hit.objects import Commit, get_object_reader
+from hit.session import get_github, get_json
+from hit.trace import span
 from hit.utility import (
     ENV,
-    PR_CLOSED,
-    clean_branch,
     fatal,
     fatal_and_kill,
     get_base_branch,
     get_current_branch,
     get_repo_names,
+    get_repo_state,
+    get_stack_branches,
     read_config,
-    update_branch,
+    run,
     warning,
 )
 
 
-def _implement_land(yes: bool) -> None:
+class _Pipeline:
+    """The dependency graph of git operations, each operation runs once its dependencies finish.
+
+    The output of each operation is captured and printed as a whole when it finishes, so the
+    output of concurrent operations is not interleaved.
+
+    Arguments:
+        executor: The executor to run the operations, it needs one worker for each operation.
+
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor) -> None:
+        self._executor = executor
+        self._start = monotonic()
+        self._lock = Lock()
+        self.timings: List[Tuple[str, float, float]] = []
+
+    def submit(
+        self, name: str, operation: Callable[[], str], *dependencies: "Future[None]"
+    ) -> "Future[None]":
+        """Submit an operation which runs after all its dependencies finish.
+
+        Arguments:
+            name: The name of the operation.
+            operation: The function returns the captured output of the operation.
+            dependencies: The futures of the operations need to finish first.
+
+        Returns:
+            The future of the operation, which raises the error of its dependencies.
+
+        """
+        return self._executor.submit(self._run, name, operation, dependencies)
+
+    def _run(
+        self, name: str, operation: Callable[[], str], dependencies: Tuple["Future[None]", ...]
+    ) -> None:
+        for dependency in dependencies:
+            dependency.result()
+
+        start = monotonic()
+        with span(name, "land"):
+            output = operation()
+        end = monotonic()
+
+        with self._lock:
+            self.timings.append((name, start - self._start, end - start))
+            click.echo(f"\n>> {name}:")
+            click.echo(output, nl=False)
+
+
+def _implement_land(yes: bool, wait: bool, timeout: int, stack: bool, verbose: bool) -> None:
     try:
         branch = get_current_branch()
         base = get_base_branch()
         if branch == base:
             fatal_and_kill(f"Do not execute 'hit land' on base branch ({base})!")
 
-        github = Github(read_config()["github"]["token"])
+        token = read_config()["github"]["token"]
 
         origin_name, upstream_name = get_repo_names()
 
-        repo = github.get_repo(upstream_name)
-
-        pulls = repo.get_pulls(head=f"{origin_name}:{branch}")
-
-        pulls_count = pulls.totalCount
-        if pulls_count == 0:
-            fatal_and_kill("No pull request found for this branch!")
-        elif pulls_count == 1:
-            pull_request = pulls[0]
-            url = pull_request.html_url
-
-            commit_count = pull_request.commits
-            if commit_count > 1:
-                warning("Pull request contains more than 1 commit.")
-                if not yes:
-                    click.confirm("Do you want to continue?", abort=True)
-                    click.echo()
-
-            remote_commits = pull_request.get_commits()
-            remote_head = remote_commits[commit_count - 1]
-            _check_pull_request_sha(remote_head)
-            _check_pull_request_checks(remote_head, yes)
-
-            _append_pull_request_url(f"{remote_commits[0].sha}^", url)
-
-            try:
-                sleep(2)
-                pull_request.merge(merge_method="rebase", sha=_get_head_sha())
-            except GithubException as error:
-                if error.status in (405, 409):
-                    if error.status == 409:
-                        warning(f"{error.data['message']} Run 'hit land' again may fix it.")
-                    else:
-                        fatal(error.data["message"])  # type: ignore[arg-type]
-
-                    click.secho(url, underline=True)
-                    sys.exit(1)
-
-                raise
+        if stack:
+            if origin_name.lower() != upstream_name.lower():
+                fatal_and_kill(
+                    "'hit land --stack' is not supported when origin is a fork, "
+                    "the pull requests can only be based on the branches of upstream!"
+                )
+            pulls = _get_pull_request_stack(token, upstream_name, origin_name, branch, base)
         else:
-            fatal_and_kill("This branch is linked to more than one pull requests!")
-
-        click.secho("> Pull Requset Merged:", fg="green")
-        click.secho(url, underline=True)
+            pulls = get_pull_requests(token, upstream_name, origin_name, branch)
+            if not pulls:
+                fatal_and_kill("No pull request found for this branch!")
+            elif len(pulls) > 1:
+                fatal_and_kill("This branch is linked to more than one pull requests!")
+
+        _check_pull_request_commits(pulls, yes)
+        _check_pull_request_sha(pulls)
+        for pull_info in pulls:
+            check_suites = pull_info.check_suites
+            if wait:
+                check_suites = _wait_pull_request_checks(
+                    token, upstream_name, pull_info.head_sha, check_suites, timeout
+                )
+            _check_pull_request_checks(check_suites, yes)
+
+        _merge_pull_requests(token, upstream_name, pulls, base, timeout if wait else None, yes)
 
         click.echo("")
-        clean_branch(branch, base, True)
-
-        click.echo("")
-        update_branch(base)
+        _clean_and_update([pull_info.head_branch for pull_info in pulls], base, verbose)
 
     except CalledProcessError:
         sys.exit(1)
 
 
+def _clean_and_update(branches: List[str], base: str, verbose: bool) -> None:
+    click.secho("> Cleaning and Updating:", bold=True)
+
+    upstreams = get_repo_state().upstreams
+    remote_branches = [
+        remote_branch for remote_branch in map(upstreams.get, branches) if remote_branch
+    ]
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        pipeline = _Pipeline(executor)
+        fetch_origin = pipeline.submit(
+            "Fetching origin", lambda: _run_git("fetch", "--prune", "origin")
+        )
+        fetch_upstream = pipeline.submit(
+            f"Fetching '{base}' from upstream", lambda: _run_git("fetch", "upstream", base)
+        )
+        delete_local = pipeline.submit(
+            "Deleting local branches",
+            lambda: _run_git("checkout", base) + _run_git("branch", "-D", *branches),
+        )
+        fast_forward = pipeline.submit(
+            f"Fast-forwarding '{base}'",
+            lambda: _run_git("merge", "--ff-only", f"upstream/{base}"),
+            fetch_upstream,
+            delete_local,
+        )
+        push = pipeline.submit(
+            f"Pushing '{base}' and deleting remote branches",
+            lambda: _push_and_delete_remote_branches(base, remote_branches),
+            fetch_origin,
+            fast_forward,
+        )
+        push.result()
+
+    if verbose:
+        _print_timings(pipeline.timings)
+
+
+def _print_timings(timings: List[Tuple[str, float, float]]) -> None:
+    click.secho("\n> Timings:", bold=True)
+    width = max(len(name) for name, _, _ in timings)
+    for name, start, duration in sorted(timings, key=lambda timing: timing[1]):
+        click.echo(f"{name:<{width}}  start {start:6.2f}s  took {duration:6.2f}s")
+
+
+def _push_and_delete_remote_branches(base: str, remote_branches: List[str]) -> str:
+    result = run(
+        ["git", "for-each-ref", "--format=%(refname:short)", "refs/remotes"],
+        env=ENV,
+        stdout=PIPE,
+        check=True,
+    )
+    existing_branches = set(result.stdout.decode().split())
+
+    remotes: Dict[str, List[str]] = {"origin": []}
+    for remote_branch in remote_branches:
+        if remote_branch in existing_branches:
+            remote, name = remote_branch.split("/", 1)
+            remotes.setdefault(remote, []).append(name)
+
+    # The base branch and the deleted branches of origin are updated by one atomic push.
+    output = _run_git(
+        "push",
+        "--atomic",
+        "origin",
+        f"{base}:{base}",
+        *(f":{name}" for name in remotes.pop("origin")),
+    )
+    for remote, names in remotes.items():
+        output += _run_git("push", "--delete", remote, *names)
+
+    return output
+
+
+def _run_git(*args: str) -> str:
+    result = run(["git", *args], env=ENV, stdout=PIPE, stderr=STDOUT, check=False)
+    output = result.stdout.decode()
+    if result.returncode:
+        click.echo(output, err=True, nl=False)
+        raise CalledProcessError(result.returncode, result.args, result.stdout)
+
+    return output
+
+
+def _get_pull_request_stack(
+    token: str, upstream_name: str, origin_name: str, branch: str, base: str
+) -> List[PullRequestInfo]:
+    branches = get_stack_branches(base)
+    pulls: Dict[str, PullRequestInfo] = {}
+    for head_branch, pull_infos in get_open_pull_requests(
+        token, upstream_name, origin_name, branches
+    ).items():
+        if len(pull_infos) > 1:
+            fatal_and_kill(f"Branch '{head_branch}' is linked to more than one pull requests!")
+        if pull_infos:
+            pulls[head_branch] = pull_infos[0]
+
+    stack = []
+    while branch != base:
+        if branch not in pulls:
+            fatal_and_kill(f"No pull request found for branch '{branch}'!")
+
+        pull_info = pulls.pop(branch)
+        stack.append(pull_info)
+        branch = pull_info.base_branch
+
+    stack.reverse()
+    return stack
+
+
+def _merge_pull_requests(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+    token: str,
+    upstream_name: str,
+    pulls: List[PullRequestInfo],
+    base: str,
+    timeout: Optional[int],
+    yes: bool,
+) -> None:
+    heads = _append_pull_request_url(f"{pulls[0].first_sha}^", pulls)
+
+    branch = get_current_branch()
+    repo = get_github(token).get_repo(upstream_name, lazy=True)
+    merged: List[PullRequestInfo] = []
+    try:
+        for pull_info in pulls:
+            head = heads[pull_info.head_branch]
+            if merged:
+                head = _rebase_onto_merged_base(
+                    pull_info.head_branch, heads[merged[-1].head_branch], base
+                )
+                if timeout is not None:
+                    # The Checks of the original head do not cover the rebased one.
+                    check_suites = _wait_pull_request_checks(
+                        token,
+                        upstream_name,
+                        head,
+                        [("queued", None)] * len(pull_info.check_suites),
+                        timeout,
+                    )
+                    _check_pull_request_checks(check_suites, yes)
+
+            _merge_pull_request(repo, pull_info, base, head)
+            merged.append(pull_info)
+    except BaseException:
+        if merged:
+            _report_partially_landed(merged, branch)
+        raise
+
+
+def _report_partially_landed(merged: List[PullRequestInfo], branch: str) -> None:
+    click.echo()
+    warning(f"Only {len(merged)} pull request(s) of the stack are landed:")
+    for pull_info in merged:
+        click.secho(pull_info.url, underline=True)
+
+    click.echo(
+        f"Run 'hit land --stack --wait' on '{branch}' to land the rest after their Checks pass."
+    )
+    run(["git", "checkout", "--quiet", branch], env=ENV, check=False)
+
+
+def _rebase_onto_merged_base(branch: str, merged_head: str, base: str) -> str:
+    # The rebase merge of Github creates new commits on the base branch, so the next branch of the
+    # stack is rebased onto them, otherwise its pull request still contains the merged commits.
+    click.secho(f"\n> Rebasing '{branch}' onto the merged '{base}':", bold=True)
+    run(["git", "fetch", "upstream", base], env=ENV, check=True)
+    try:
+        run(
+            ["git", "rebase", "--quiet", "--onto", f"upstream/{base}", merged_head, branch],
+            env=ENV,
+            check=True,
+        )
+    except CalledProcessError:
+        run(["git", "rebase", "--abort"], env=ENV, check=False)
+        fatal_and_kill(f"Rebasing '{branch}' onto the merged '{base}' failed!")
+
+    run(["git", "push", "--force", "origin", branch], env=ENV, check=True)
+    click.echo()
+    return _get_head_sha()
+
+
+def _merge_pull_request(
+    repo: Repository.Repository, pull_info: PullRequestInfo, base: str, sha: str
+) -> None:
+    pull_request = repo.get_pull(pull_info.number)
+    try:
+        if pull_info.base_branch != base:
+            pull_request.edit(base=base)
+
+        with span("sleep", "land"):
+            sleep(2)
+        pull_request.merge(merge_method="rebase", sha=sha)
+    except GithubException as error:
+        if error.status in (405, 409):
+            if error.status == 409:
+                warning(f"{error.data['message']} Run 'hit land' again may fix it.")
+            else:
+                fatal(error.data["message"])  # type: ignore[arg-type]
+
+            click.secho(pull_info.url, underline=True)
+            sys.exit(1)
+
+        raise
+
+    click.secho("> Pull Requset Merged:", fg="green")
+    click.secho(pull_info.url, underline=True)
+
+
+def _check_pull_request_commits(pulls: List[PullRequestInfo], yes: bool) -> None:
+    for pull_info in pulls:
+        if pull_info.commit_count > 1:
+            warning("Pull request contains more than 1 commit.")
+            if len(pulls) > 1:
+                click.secho(pull_info.url, underline=True)
+            if not yes:
+                click.confirm("Do you want to continue?", abort=True)
+                click.echo()
+
+
 def _get_head_sha() -> str:
-    result = run(["git", "log", "--format=%H", "-n1"], env=ENV, stdout=PIPE, check=True)
-    return result.stdout.decode().strip()
+    return get_object_reader().read_commit("HEAD").sha
 
 
-def _check_pull_request_sha(commit: Commit.Commit) -> None:
-    local_commit_sha = _get_head_sha()
-    if local_commit_sha != commit.sha:
+def _check_pull_request_sha(pulls: List[PullRequestInfo]) -> None:
+    reader = get_object_reader()
+    if any(
+        reader.read_commit(f"refs/heads/{pull_info.head_branch}").sha != pull_info.head_sha
+        for pull_info in pulls
+    ):
         fatal_and_kill("Unpushed changes detected, please push it before landing!")
 
 
-def _check_pull_request_checks(commit: Commit.Commit, yes: bool) -> None:
+def _check_pull_request_checks(check_suites: List[Tuple[str, Optional[str]]], yes: bool) -> None:
     completed_flag = True
     success_flag = True
 
-    for suite in commit.get_check_suites():  # type: ignore[call-arg]
-        if suite.status != "completed":
+    for status, conclusion in check_suites:
+        if status != "completed":
             completed_flag = False
-        elif suite.conclusion != "success":
+        elif conclusion != "success":
             success_flag = False
             break
 
@@ -127,46 +386,157 @@ def _check_pull_request_checks(commit: Commit.Commit, yes: bool) -> None:
     click.echo()
 
 
-def _append_pull_request_url(base: str, url: str) -> None:
-    result = run(["git", "log", "--format=%H", f"{base}.."], env=ENV, stdout=PIPE, check=True)
-    commits = result.stdout.decode().strip().split("\n")
+_MIN_POLL_INTERVAL = 5
+_MAX_POLL_INTERVAL = 60
+
+
+def _wait_pull_request_checks(
+    token: str,
+    repo_name: str,
+    sha: str,
+    check_suites: List[Tuple[str, Optional[str]]],
+    timeout: int,
+) -> List[Tuple[str, Optional[str]]]:
+    click.secho("> Waiting for Checks:", bold=True)
+
+    start = monotonic()
+    interval = _MIN_POLL_INTERVAL
+    while True:
+        total = len(check_suites)
+        completed = sum(status == "completed" for status, _ in check_suites)
+        failed = sum(
+            status == "completed" and conclusion != "success" for status, conclusion in check_suites
+        )
+        elapsed = int(monotonic() - start)
+        minutes, seconds = divmod(elapsed, 60)
+        click.echo(
+            f"\r{completed}/{total} completed, {failed} failed ({minutes:02}:{seconds:02})",
+            nl=False,
+        )
+
+        if failed or completed == total or elapsed + interval > timeout:
+            click.echo("\n")
+            return check_suites
+
+        sleep(interval)
+
+        suites = get_json(token, f"/repos/{repo_name}/commits/{sha}/check-suites", per_page=100)
+        latest = [(suite["status"], suite["conclusion"]) for suite in suites["check_suites"]]
+        # The check suites of a just pushed commit are not created at once.
+        if latest == check_suites or len(latest) < len(check_suites):
+            interval = min(interval * 2, _MAX_POLL_INTERVAL)
+        else:
+            interval = _MIN_POLL_INTERVAL
+            check_suites = latest
+
 
-    trailer = f"{PR_CLOSED}{url}"
+def _append_pull_request_url(base: str, pulls: List[PullRequestInfo]) -> Dict[str, str]:
+    branches = [pull_info.head_branch for pull_info in pulls]
+    commits = list(get_object_reader().iter_commits(f"refs/heads/{branches[-1]}", base))
+    commits.reverse()
 
+    trailers = []
+    pull_iter = iter(pulls)
+    pull_info = next(pull_iter)
     for commit in commits:
-        result = run(["git", "log", "--format=%b", "-n1", commit], env=ENV, stdout=PIPE, check=True)
-        lines = result.stdout.decode().strip().split("\n")
+        trailers.append(f"{PR_CLOSED}{pull_info.url}")
+        if commit.sha == pull_info.head_sha:
+            pull_info = next(pull_iter, pull_info)
 
-        match = False
-        for line in reversed(lines):
-            if not line:
-                continue
+    if all(
+        _has_pull_request_url(commit.message, trailer) for commit, trailer in zip(commits, trailers)
+    ):
+        return {pull_info.head_branch: pull_info.head_sha for pull_info in pulls}
 
-            if not match:
-                if line == trailer:
-                    match = True
-                    continue
+    click.secho("> Rewording:", bold=True)
+    click.echo("Appending pull request URL to commit message.")
+    if any(len(commit.parents) > 1 for commit in commits):
+        if len(pulls) > 1:
+            fatal_and_kill("Merge commits are not supported when landing a stack!")
 
-                break
+        _rebase_commit_messages(base, trailers[0])
+        heads = {branches[0]: _get_head_sha()}
+    else:
+        heads = _rewrite_commit_messages(commits, trailers, pulls)
 
-            if line.startswith(PR_CLOSED):
-                match = False
-                break
+    click.secho("\n> Pushing:", bold=True)
+    run(["git", "push", "--force", "origin"] + branches, env=ENV, check=True)
+    click.echo()
+
+    return heads
+
+
+def _has_pull_request_url(message: str, trailer: str) -> bool:
+    match = False
+    for line in reversed(message.strip().split("\n")):
+        if not line:
+            continue
 
         if not match:
+            if line == trailer:
+                match = True
+                continue
+
             break
 
-    else:
-        return
+        if line.startswith(PR_CLOSED):
+            match = False
+            break
 
+    return match
+
+
+def _rewrite_commit_messages(
+    commits: List[Commit], trailers: List[str], pulls: List[PullRequestInfo]
+) -> Dict[str, str]:
+    # 'git commit-tree' ignores 'commit.gpgSign', which 'git commit' and 'git rebase' respect.
+    result = run(["git", "config", "--bool", "commit.gpgSign"], env=ENV, stdout=PIPE, check=False)
+    sign_args = ["-S"] if result.stdout.decode().strip() == "true" else []
+
+    rewritten = {}
+    parent = commits[0].parents[0]
+    for commit, trailer in zip(commits, trailers):
+        lines = clean_commit_message(commit.message.split("\n"))
+        lines.append(trailer)
+
+        local_env = ENV.copy()
+        local_env["GIT_AUTHOR_NAME"] = commit.author_name
+        local_env["GIT_AUTHOR_EMAIL"] = commit.author_email
+        local_env["GIT_AUTHOR_DATE"] = commit.author_date
+
+        parent = (
+            run(
+                ["git", "commit-tree", *sign_args, commit.tree, "-p", parent],
+                env=local_env,
+                input="\n".join(lines).encode() + b"\n",
+                stdout=PIPE,
+                check=True,
+            )
+            .stdout.decode()
+            .strip()
+        )
+        rewritten[commit.sha] = parent
+
+    updates = "".join(
+        f"update refs/heads/{pull_info.head_branch} "
+        f"{rewritten[pull_info.head_sha]} {pull_info.head_sha}\n"
+        for pull_info in pulls
+    )
+    run(
+        ["git", "update-ref", "-m", "hit land: append pull request url", "--stdin"],
+        env=ENV,
+        input=updates.encode(),
+        check=True,
+    )
+    return {pull_info.head_branch: rewritten[pull_info.head_sha] for pull_info in pulls}
+
+
+def _rebase_commit_messages(base: str, trailer: str) -> None:
     local_env = ENV.copy()
-    local_env["GIT_EDITOR"] = f"hit message append '{trailer}'"
-    local_env["GIT_SEQUENCE_EDITOR"] = "hit message reword"
+    # The editor runs the file instead of 'python -m hit.message', the module may be shadowed by a
+    # 'hit' directory in the working directory, which is the first entry of 'sys.path' with '-m'.
+    editor = f"{quote(sys.executable)} {quote(hit.message.__file__)}"
+    local_env["GIT_EDITOR"] = f"{editor} append {quote(trailer)}"
+    local_env["GIT_SEQUENCE_EDITOR"] = f"{editor} reword"
 
-    click.secho("> Rewording:", bold=True)
-    click.echo("Appending pull request URL to commit message.")
     run(["git", "rebase", "--interactive", "--quiet", base], env=local_env, stdout=PIPE, check=True)
-
-    click.secho("\n> Pushing:", bold=True)
-    run(["git", "push", "--force"], env=ENV, check=True)
-    click.echo()
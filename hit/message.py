@@ -3,10 +3,52 @@
 # Copyright 2022 Graviti. Licensed under MIT License.
 #
 
-"""Implementation of hit push."""
+"""Implementation of hit message.
 
+The module only depends on the standard library, it can be used as a fast-start git editor by
+running the file with python, which skips the import of click and the building of the whole hit
+CLI.
 
-from hit.utility import clean_commit_message
+"""
+
+import sys
+from typing import Iterable, List
+
+PR_CLOSED = "PR Closed: "
+
+_USAGE = "usage: python message.py {reword FILE | append URL FILE}"
+
+
+def clean_commit_message(lines: Iterable[str]) -> List[str]:
+    """Chean the commit message.
+
+    Arguments:
+        lines: The commite messsage lines.
+
+    Returns:
+        The commit message lines after cleaning.
+
+    """
+    results = []
+    is_blank = True
+    for line in lines:
+        line = line.rstrip()
+        if line.startswith("#"):
+            continue
+
+        if not line or line.startswith(PR_CLOSED):
+            if not is_blank:
+                is_blank = True
+                results.append("")
+            continue
+
+        is_blank = False
+        results.append(line)
+
+    if not is_blank:
+        results.append("")
+
+    return results
 
 
 def _implement_reword(file: str) -> None:
@@ -28,3 +70,16 @@ def _implement_append(url: str, file: str) -> None:
 
     with open(file, "w", encoding="utf-8") as fp:
         fp.write("\n".join(lines))
+
+
+def _main(args: List[str]) -> None:
+    if len(args) == 2 and args[0] == "reword":
+        _implement_reword(args[1])
+    elif len(args) == 3 and args[0] == "append":
+        _implement_append(args[1], args[2])
+    else:
+        sys.exit(_USAGE)
+
+
+if __name__ == "__main__":
+    _main(sys.argv[1:])
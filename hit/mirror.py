@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+#
+# Copyright 2022 Graviti. Licensed under MIT License.
+#
+
+"""The local mirror cache of the cloned repositories.
+
+Each upstream repository is mirrored into a bare repo keyed by its ssh url, the mirror is
+refreshed by an incremental 'git fetch' and borrowed by 'git clone --reference --dissociate', so
+the clones never depend on the mirrors and the mirrors can be evicted at any time.
+
+"""
+
+import os
+import re
+import shutil
+from configparser import ConfigParser
+from contextlib import contextmanager
+from hashlib import sha256
+from subprocess import DEVNULL, PIPE, CalledProcessError
+from typing import Iterator, List, NamedTuple, Optional
+
+from hit.utility import ENV, cache_dirpath, config_filepath, fatal_and_kill, run, warning
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore[assignment]
+
+_MIRROR_CACHE_SIZE = "10G"
+_MIRROR_SUFFIX = ".git"
+_LOCK_SUFFIX = ".lock"
+_REFSPECS = ("+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*")
+_SIZE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?\s*$", re.IGNORECASE)
+_SIZE_UNITS = "KMGT"
+
+
+class Mirror(NamedTuple):
+    """The information of a cached mirror.
+
+    Attributes:
+        path: The path of the bare mirror repo.
+        url: The url of the mirrored repository.
+        size: The disk usage of the mirror in bytes.
+        last_used: The timestamp when the mirror was borrowed last time.
+
+    """
+
+    path: str
+    url: str
+    size: int
+    last_used: float
+
+
+class MirrorCache:
+    """The on-disk cache of the bare mirror repos, evicted in LRU order.
+
+    The mirrors are exclusively locked while being created, refreshed or evicted, and shared
+    locked while being borrowed, so a borrowed mirror is never evicted.
+
+    Arguments:
+        dirpath: The directory to store the mirrors.
+        size: The max total size of the mirrors in bytes.
+
+    """
+
+    def __init__(self, dirpath: str, size: int) -> None:
+        self._dirpath = dirpath
+        self._size = size
+
+    def get_path(self, url: str) -> str:
+        """Get the path of the mirror of the repository.
+
+        Arguments:
+            url: The url of the repository.
+
+        Returns:
+            The path of the bare mirror repo.
+
+        """
+        return os.path.join(self._dirpath, sha256(url.encode()).hexdigest()[:16] + _MIRROR_SUFFIX)
+
+    @contextmanager
+    def borrow(self, url: str) -> Iterator[Optional[str]]:
+        """Create or refresh the mirror of the repository, then keep it from eviction.
+
+        The cache is pruned to its size limit when the mirror is returned.
+
+        Arguments:
+            url: The url of the repository.
+
+        Yields:
+            The path of the mirror, None if the mirror is not available.
+
+        """
+        path = self.get_path(url)
+        os.makedirs(self._dirpath, exist_ok=True)
+        with _lock(path) as fd:
+            available = _update_mirror(path, url)
+            if available:
+                os.utime(path)
+
+            # The conversion is not atomic, the mirror may be evicted in between.
+            if fcntl and fd is not None:
+                fcntl.flock(fd, fcntl.LOCK_SH)
+            try:
+                yield path if available and os.path.isdir(path) else None
+            finally:
+                self.prune(self._size)
+
+    def list(self) -> List[Mirror]:
+        """List all the cached mirrors.
+
+        Returns:
+            The cached mirrors, the most recently used first.
+
+        """
+        mirrors = []
+        for entry in _scan_mirrors(self._dirpath):
+            try:
+                last_used = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            mirrors.append(
+                Mirror(entry.path, _get_url(entry.path), _get_size(entry.path), last_used)
+            )
+
+        mirrors.sort(key=lambda mirror: mirror.last_used, reverse=True)
+        return mirrors
+
+    def prune(self, size: int) -> List[Mirror]:
+        """Evict the least recently used mirrors until the total size is not over the limit.
+
+        The borrowed mirrors are skipped.
+
+        Arguments:
+            size: The max total size of the mirrors in bytes.
+
+        Returns:
+            The evicted mirrors.
+
+        """
+        mirrors = self.list()
+        total_size = sum(mirror.size for mirror in mirrors)
+        evicted = []
+        for mirror in reversed(mirrors):
+            if total_size <= size:
+                break
+
+            with _lock(mirror.path, blocking=False) as fd:
+                if fd is None:
+                    continue
+
+                shutil.rmtree(mirror.path, ignore_errors=True)
+                os.remove(mirror.path + _LOCK_SUFFIX)
+
+            total_size -= mirror.size
+            evicted.append(mirror)
+
+        return evicted
+
+
+def mirror_cache_dirpath() -> str:
+    """Get path of the mirror cache directory.
+
+    Returns:
+        The path of mirror cache directory.
+
+    """
+    return os.path.join(cache_dirpath(), "mirrors")
+
+
+def get_mirror_cache_size() -> int:
+    """Get the max total size of the mirrors, configured by 'mirror_size' in the 'cache' section.
+
+    Returns:
+        The max total size of the mirrors in bytes.
+
+    """
+    config_parser = ConfigParser()
+    config_parser.read(config_filepath())
+    value = config_parser.get("cache", "mirror_size", fallback=_MIRROR_CACHE_SIZE)
+    size = parse_size(value)
+    if size is None:
+        fatal_and_kill(f"Invalid 'mirror_size' in '{config_filepath()}': '{value}'!")
+
+    return size
+
+
+def parse_size(value: str) -> Optional[int]:
+    """Parse the human readable size.
+
+    Arguments:
+        value: The size with an optional binary unit, like '512M' or '10GiB'.
+
+    Returns:
+        The size in bytes, None if the value is invalid.
+
+    """
+    match = _SIZE_PATTERN.match(value)
+    if not match:
+        return None
+
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** (_SIZE_UNITS.find(unit.upper()) + 1 if unit else 0))
+
+
+def format_size(size: float) -> str:
+    """Format the size into the human readable form.
+
+    Arguments:
+        size: The size in bytes.
+
+    Returns:
+        The human readable size, like '1.5 GiB'.
+
+    """
+    if size < 1024:
+        return f"{int(size)} B"
+
+    index = 0
+    size /= 1024
+    while size >= 1024 and index < len(_SIZE_UNITS) - 1:
+        size /= 1024
+        index += 1
+
+    return f"{size:.1f} {_SIZE_UNITS[index]}iB"
+
+
+def _update_mirror(path: str, url: str) -> bool:
+    if os.path.isdir(path):
+        try:
+            _run_git(path, "fetch", "--prune", "origin")
+        except CalledProcessError:
+            warning(f"Refreshing the mirror of '{url}' failed, the stale mirror is used.")
+        return True
+
+    temp_path = f"{path}.tmp"
+    shutil.rmtree(temp_path, ignore_errors=True)
+    try:
+        run(["git", "init", "--bare", "--quiet", temp_path], env=ENV, check=True)
+        _run_git(temp_path, "config", "remote.origin.url", url)
+        for refspec in _REFSPECS:
+            _run_git(temp_path, "config", "--add", "remote.origin.fetch", refspec)
+        _run_git(temp_path, "fetch", "origin")
+    except CalledProcessError:
+        shutil.rmtree(temp_path, ignore_errors=True)
+        warning(f"Creating the mirror of '{url}' failed, clone without it.")
+        return False
+
+    os.rename(temp_path, path)
+    return True
+
+
+def _run_git(path: str, *args: str) -> None:
+    run(["git", "--git-dir", path, *args], env=ENV, check=True)
+
+
+def _get_url(path: str) -> str:
+    result = run(
+        ["git", "--git-dir", path, "config", "remote.origin.url"],
+        env=ENV,
+        stdout=PIPE,
+        stderr=DEVNULL,
+        check=False,
+    )
+    return result.stdout.decode().strip()
+
+
+def _get_size(path: str) -> int:
+    size = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                size += os.lstat(os.path.join(dirpath, filename)).st_size
+            except FileNotFoundError:
+                continue
+
+    return size
+
+
+def _scan_mirrors(dirpath: str) -> List["os.DirEntry[str]"]:
+    try:
+        with os.scandir(dirpath) as entries:
+            return [entry for entry in entries if entry.name.endswith(_MIRROR_SUFFIX)]
+    except FileNotFoundError:
+        return []
+
+
+@contextmanager
+def _lock(path: str, blocking: bool = True) -> Iterator[Optional[int]]:
+    fd = _acquire(path + _LOCK_SUFFIX, blocking)
+    try:
+        yield fd
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+
+def _acquire(lock_path: str, blocking: bool) -> Optional[int]:
+    # The lock file is removed with the evicted mirror, so the lock is retried when the lock file
+    # was removed or replaced after it was opened.
+    while True:
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        if not fcntl:
+            return fd
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            os.close(fd)
+            return None
+
+        try:
+            if os.fstat(fd).st_ino == os.stat(lock_path).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+
+        os.close(fd)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+#
+# Copyright 2022 Graviti. Licensed under MIT License.
+#
+
+"""Git object reader of hit CLI backed by one long-lived 'git cat-file --batch' process."""
+
+import atexit
+from subprocess import PIPE, Popen
+from threading import Lock
+from typing import IO, Iterator, List, NamedTuple, Optional, Tuple
+
+from hit.utility import ENV, fatal_and_kill
+
+
+class Commit(NamedTuple):
+    """The parsed git commit object.
+
+    Attributes:
+        sha: The sha of the commit.
+        tree: The sha of the tree of the commit.
+        parents: The shas of the parent commits.
+        author_name: The name of the author.
+        author_email: The email of the author.
+        author_date: The author date in git raw format, like '1650000000 +0800'.
+        message: The raw commit message.
+
+    """
+
+    sha: str
+    tree: str
+    parents: List[str]
+    author_name: str
+    author_email: str
+    author_date: str
+    message: str
+
+
+class ObjectReader:
+    """The reader of git objects, all the objects are read through one 'git cat-file' process.
+
+    The process is started on the first read, object names are resolved by git on every read,
+    so the refs and objects written after the process started are visible.
+
+    """
+
+    def __init__(self) -> None:
+        self._process: Optional["Popen[bytes]"] = None
+        self._lock = Lock()
+
+    def read(self, name: str) -> Optional[Tuple[str, str, bytes]]:
+        """Read a git object.
+
+        Arguments:
+            name: The name of the object, like a sha, a ref or an expression like 'HEAD^'.
+
+        Returns:
+            The sha, the type and the content of the object, None if it does not exist.
+
+        """
+        with self._lock:
+            stdin, stdout = self._get_pipes()
+            stdin.write(f"{name}\n".encode())
+            stdin.flush()
+
+            header = stdout.readline().decode().split()
+            if len(header) != 3:
+                return None
+
+            sha, kind, size = header
+            content = stdout.read(int(size))
+            stdout.read(1)
+
+        return sha, kind, content
+
+    def read_commit(self, name: str) -> Commit:
+        """Read and parse a git commit object.
+
+        Arguments:
+            name: The name of the commit, like a sha, a ref or an expression like 'HEAD^'.
+
+        Returns:
+            The parsed commit.
+
+        """
+        result = self.read(name)
+        if result is None or result[1] != "commit":
+            fatal_and_kill(f"Commit '{name}' not found!")
+
+        return _parse_commit(result[0], result[2])
+
+    def iter_commits(self, head: str, base: str) -> Iterator[Commit]:
+        """Iterate the first-parent history from the head down to the base lazily.
+
+        Arguments:
+            head: The name of the newest commit.
+            base: The name of the commit where the iteration stops, it is not yielded.
+
+        Yields:
+            The commits from the newest to the oldest.
+
+        """
+        base_sha = self.read_commit(base).sha
+        commit = self.read_commit(head)
+        while commit.sha != base_sha:
+            yield commit
+
+            if not commit.parents:
+                fatal_and_kill(f"Commit '{base}' is not an ancestor of '{head}'!")
+
+            commit = self.read_commit(commit.parents[0])
+
+    def close(self) -> None:
+        """Stop the 'git cat-file' process."""
+        with self._lock:
+            if self._process is None:
+                return
+
+            self._process.stdin.close()  # type: ignore[union-attr]
+            self._process.wait()
+            self._process = None
+
+    def _get_pipes(self) -> Tuple[IO[bytes], IO[bytes]]:
+        if self._process is None:
+            self._process = Popen(  # pylint: disable=consider-using-with
+                ["git", "cat-file", "--batch"], env=ENV, stdin=PIPE, stdout=PIPE
+            )
+            atexit.register(self.close)
+
+        return self._process.stdin, self._process.stdout  # type: ignore[return-value]
+
+
+def _parse_commit(sha: str, content: bytes) -> Commit:
+    headers, _, message = content.decode(errors="replace").partition("\n\n")
+
+    tree = ""
+    parents = []
+    author = ""
+    for line in headers.split("\n"):
+        key, _, value = line.partition(" ")
+        if key == "tree":
+            tree = value
+        elif key == "parent":
+            parents.append(value)
+        elif key == "author":
+            author = value
+
+    identity, _, author_date = author.rpartition("> ")
+    author_name, _, author_email = identity.partition(" <")
+    return Commit(sha, tree, parents, author_name, author_email, author_date, message)
+
+
+_OBJECT_READER = ObjectReader()
+
+
+def get_object_reader() -> ObjectReader:
+    """Get the git object reader shared by the whole command.
+
+    Returns:
+        The shared ObjectReader instance.
+
+    """
+    return _OBJECT_READER
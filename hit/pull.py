@@ -5,28 +5,89 @@
 
 """Implementation of hit pull."""
 
+import os
 import sys
-from subprocess import CalledProcessError, run
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from subprocess import PIPE, STDOUT, CalledProcessError, CompletedProcess
+from typing import Dict, List, Optional, Tuple
 
-from hit.utility import ENV, get_base_branch, get_current_branch, update_branch
+import click
 
+from hit.utility import ENV, get_base_branch, get_update_commands, run, update_branch
+
+_UPDATED = "Updated"
+_CURRENT = "Already up to date"
+_FAILED = "Failed"
+
+
+def _implement_pull(workspace: Optional[str], jobs: int) -> None:
+    if workspace:
+        _pull_all(workspace, jobs)
+        return
 
-def _implement_pull() -> None:
     try:
-        branch = get_current_branch()
-        base = get_base_branch()
+        update_branch(get_base_branch())
+
     except CalledProcessError:
         sys.exit(1)
 
-    try:
-        if branch != base:
-            run(["git", "checkout", base], env=ENV, check=True)
 
-        update_branch(base)
+def _pull_all(workspace: str, jobs: int) -> None:
+    results: Dict[str, List[str]] = {_UPDATED: [], _CURRENT: [], _FAILED: []}
 
-    except CalledProcessError:
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(_update_repo, path) for path in _find_repos(workspace)]
+        for future in as_completed(futures):
+            path, status, output = future.result()
+            if status is None:
+                continue
+
+            name = os.path.relpath(path, workspace)
+            results[status].append(name)
+            click.secho(f"> {name}:", bold=True)
+            click.echo(output)
+
+    click.secho("> Summary:", bold=True)
+    for status, color in ((_UPDATED, "green"), (_CURRENT, None), (_FAILED, "red")):
+        names = sorted(results[status])
+        click.secho(f"{status}: {len(names)}", fg=color)
+        for name in names:
+            click.echo(f"    {name}")
+
+    if results[_FAILED]:
         sys.exit(1)
 
-    finally:
-        if branch != base:
-            run(["git", "checkout", branch], env=ENV, check=True)
+
+def _find_repos(workspace: str) -> List[str]:
+    repos = []
+    for root, dirnames, _ in os.walk(workspace):
+        if ".git" in dirnames:
+            repos.append(root)
+            dirnames.clear()
+        else:
+            dirnames[:] = [dirname for dirname in dirnames if not dirname.startswith(".")]
+
+    return repos
+
+
+def _update_repo(path: str) -> Tuple[str, Optional[str], str]:
+    def git(*args: str) -> "CompletedProcess[bytes]":
+        return run(["git", "-C", path, *args], env=ENV, stdout=PIPE, stderr=STDOUT, check=False)
+
+    result = git("config", "--local", "hit.baseBranch")
+    if result.returncode != 0:
+        return path, None, ""
+
+    base = result.stdout.decode().strip()
+    current_branch = git("branch", "--show-current").stdout.decode().strip()
+    before = git("rev-parse", f"refs/heads/{base}").stdout
+
+    outputs = []
+    for command in get_update_commands(base, current_branch):
+        result = git(*command)
+        outputs.append(result.stdout.decode())
+        if result.returncode != 0:
+            return path, _FAILED, "".join(outputs)
+
+    status = _CURRENT if git("rev-parse", f"refs/heads/{base}").stdout == before else _UPDATED
+    return path, status, "".join(outputs)
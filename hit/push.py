@@ -6,59 +6,73 @@
 """Implementation of hit push."""
 
 import sys
-from subprocess import PIPE, CalledProcessError, run
-from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import CalledProcessError
+from typing import List, Optional, Tuple
 
 import click
-from github import Github, GithubException, PullRequest, Repository
+from github import GithubException, PullRequest, Repository
+from github.GithubException import UnknownObjectException
 
+from hit.graphql import PullRequestInfo, get_open_pull_requests, get_pull_requests
+from hit.message import clean_commit_message
+from hit.objects import get_object_reader
+from hit.session import get_github
 from hit.utility import (
     ENV,
-    clean_commit_message,
     fatal,
     fatal_and_kill,
     get_base_branch,
     get_current_branch,
+    get_pull_request_number,
     get_remote_branch,
     get_repo_names,
+    get_stack_branches,
     read_config,
+    run,
+    set_pull_request_number,
     warning,
 )
 
+_MAX_WORKERS = 4
 
-def _implement_push(base: str, force: bool) -> None:
+
+def _implement_push(base: str, force: bool, stack: bool) -> None:
     try:
         branch = get_current_branch()
         base = base if base else get_base_branch()
         if branch == base:
             fatal_and_kill(f"Do not execute 'hit push' on base branch ({base})!")
 
-        config = read_config()
-        github = Github(config["github"]["token"])
+        token = read_config()["github"]["token"]
 
         origin_name, upstream_name = get_repo_names()
+        head_owner = origin_name.split("/", 1)[0]
 
-        repo = github.get_repo(upstream_name)
+        if stack:
+            if origin_name.lower() != upstream_name.lower():
+                fatal_and_kill(
+                    "'hit push --stack' is not supported when origin is a fork, "
+                    "the pull requests can only be based on the branches of upstream!"
+                )
+            _push_stack(token, upstream_name, origin_name, base, force)
+            return
 
-        head = f"{origin_name}:{branch}"
-        pulls = repo.get_pulls(head=head)
+        repo, pull_request = _push_and_find_pull_request(
+            token, upstream_name, origin_name, branch, force
+        )
 
-        pulls_count = pulls.totalCount
-        if pulls_count == 0:
-            _git_push(branch, force)
-            pull_request = _create_pull_request(
-                repo, base, f"{origin_name.split('/', 1)[0]}:{branch}"
-            )
+        if pull_request is None:
+            pull_request = _create_pull_request(repo, base, f"{head_owner}:{branch}")
 
             click.secho("\n> Pull Requset Created:", fg="green")
-        elif pulls_count == 1:
-            _git_push(branch, force)
-            pull_request = pulls[0]
+        else:
             _update_pull_request(pull_request)
 
             click.secho("\n> Pull Requset Updated:", fg="green")
-        else:
-            fatal_and_kill("This branch is linked to more than one pull requests!")
+
+        if get_pull_request_number(branch) != pull_request.number:
+            set_pull_request_number(branch, pull_request.number)
 
         click.secho(pull_request.html_url, underline=True)
 
@@ -70,6 +84,41 @@ def _implement_push(base: str, force: bool) -> None:
         sys.exit(1)
 
 
+def _push_and_find_pull_request(
+    token: str, upstream_name: str, origin_name: str, branch: str, force: bool
+) -> Tuple[Repository.Repository, Optional[PullRequest.PullRequest]]:
+    repo = get_github(token).get_repo(upstream_name, lazy=True)
+    number = get_pull_request_number(branch)
+    if number is None:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pulls_future = executor.submit(
+                get_pull_requests, token, upstream_name, origin_name, branch
+            )
+            _git_push(branch, force)
+            pulls = pulls_future.result()
+    else:
+        _git_push(branch, force)
+        try:
+            pull_request = repo.get_pull(number)
+            # The cached number may be stale after the branch was renamed, recreated or copied.
+            if (
+                pull_request.state == "open"
+                and pull_request.head.ref == branch
+                and pull_request.head.user.login.lower() == origin_name.split("/", 1)[0].lower()
+            ):
+                return repo, pull_request
+        except UnknownObjectException:
+            pass
+
+        set_pull_request_number(branch, None)
+        pulls = get_pull_requests(token, upstream_name, origin_name, branch)
+
+    if len(pulls) > 1:
+        fatal_and_kill("This branch is linked to more than one pull requests!")
+
+    return repo, repo.get_pull(pulls[0].number) if pulls else None
+
+
 def _git_push(branch: str, force: bool) -> None:
     click.secho("> Pushing:", bold=True)
 
@@ -83,17 +132,79 @@ def _git_push(branch: str, force: bool) -> None:
     run(push_command, env=ENV, check=True)
 
 
-def _get_cleanup_commit_message() -> Tuple[str, str]:
-    result = run(["git", "log", "--format=%B", "-n1"], env=ENV, stdout=PIPE, check=True)
-    lines = result.stdout.decode().strip().split("\n")
-    lines = clean_commit_message(lines)
+def _push_stack(token: str, upstream_name: str, origin_name: str, base: str, force: bool) -> None:
+    branches = get_stack_branches(base)
+    head_owner = origin_name.split("/", 1)[0]
+
+    with ThreadPoolExecutor(max_workers=_MAX_WORKERS) as executor:
+        pulls_future = executor.submit(
+            get_open_pull_requests, token, upstream_name, origin_name, branches
+        )
+
+        click.secho("> Pushing:", bold=True)
+        run(
+            ["git", "push", "--set-upstream"] + (["-f"] if force else []) + ["origin"] + branches,
+            env=ENV,
+            check=True,
+        )
+
+        pulls = {}
+        for branch, pull_infos in pulls_future.result().items():
+            if len(pull_infos) > 1:
+                fatal_and_kill(f"Branch {branch} is linked to more than one pull requests!")
+            if pull_infos:
+                pulls[branch] = pull_infos[0]
+
+        repo = get_github(token).get_repo(upstream_name, lazy=True)
+        futures = [
+            executor.submit(
+                _push_stack_pull_request, repo, pulls.get(branch), branch, parent, head_owner
+            )
+            for parent, branch in zip([base] + branches, branches)
+        ]
+        _print_pull_requests([future.result() for future in futures])
+
+
+def _print_pull_requests(results: List[Tuple[str, str, str]]) -> None:
+    click.secho("\n> Pull Requests:", fg="green")
+    width = max(len(branch) for branch, _, _ in results)
+    for branch, action, url in results:
+        click.echo(f"{branch:<{width}}  {action:<9}  {click.style(url, underline=True)}")
+
+
+def _push_stack_pull_request(
+    repo: Repository.Repository,
+    pull_info: Optional[PullRequestInfo],
+    branch: str,
+    parent: str,
+    head_owner: str,
+) -> Tuple[str, str, str]:
+    if pull_info is None:
+        pull_request = _create_pull_request(repo, parent, f"{head_owner}:{branch}", branch)
+        return branch, "Created", pull_request.html_url
+
+    title, body = _get_cleanup_commit_message(branch)
+    if (pull_info.title, pull_info.body, pull_info.base_branch) == (
+        title,
+        body if body else None,
+        parent,
+    ):
+        return branch, "Unchanged", pull_info.url
+
+    repo.get_pull(pull_info.number).edit(title=title, body=body, base=parent)
+    return branch, "Updated", pull_info.url
+
+
+def _get_cleanup_commit_message(ref: str = "HEAD") -> Tuple[str, str]:
+    message = get_object_reader().read_commit(ref).message
+    lines = clean_commit_message(message.strip().split("\n"))
     return lines[0], "\n".join(lines[1:]).strip()
 
 
 def _create_pull_request(
-    repo: Repository.Repository, base: str, head: str
+    repo: Repository.Repository, base: str, head: str, ref: str = "HEAD"
 ) -> PullRequest.PullRequest:
-    title, body = _get_cleanup_commit_message()
+    title, body = _get_cleanup_commit_message(ref)
 
     try:
         return repo.create_pull(title=title, body=body, base=base, head=head)
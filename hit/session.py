@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+#
+# Copyright 2022 Graviti. Licensed under MIT License.
+#
+
+"""Shared HTTP session and conditional-request cache of hit CLI."""
+
+import json
+import os
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from hashlib import sha256
+from io import BytesIO
+from tempfile import NamedTemporaryFile
+from time import sleep, time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from github import Github
+from github.Requester import HTTPRequestsConnectionClass, HTTPSRequestsConnectionClass, Requester
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+
+from hit.trace import span
+from hit.utility import cache_dirpath, warning
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore[assignment]
+
+_API_URL = "https://api.github.com"
+_TIMEOUT = 15
+_HTTP_CACHE_SIZE = 32 * 1024 * 1024
+_DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+_BURST = 10
+_LOW_REMAINING = 100
+_MIN_RATE = 1 / 60
+_SECONDARY_LIMIT_WAIT = 60
+_MAX_RATE_LIMIT_WAIT = 300
+_STATE_TTL = 3600
+
+
+class ResponseCache:
+    """The on-disk cache of the GET responses with validators, evicted in LRU order.
+
+    Arguments:
+        dirpath: The directory to store the cached responses.
+        size: The max total size of the cached responses in bytes.
+
+    """
+
+    def __init__(self, dirpath: str, size: int = _HTTP_CACHE_SIZE) -> None:
+        self._dirpath = dirpath
+        self._size = size
+
+    @staticmethod
+    def get_key(request: requests.PreparedRequest) -> str:
+        """Get the cache key of the request, which is keyed by the url and the token.
+
+        Arguments:
+            request: The request needs to be cached.
+
+        Returns:
+            The cache key of the request.
+
+        """
+        authorization = request.headers.get("Authorization", "")
+        return sha256(f"{authorization}\n{request.url}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        """Get the cached response.
+
+        Arguments:
+            key: The cache key of the request.
+
+        Returns:
+            The metadata and the body of the cached response, None if it is not cached.
+
+        """
+        path = os.path.join(self._dirpath, key)
+        try:
+            with open(path, "rb") as fp:
+                metadata = json.loads(fp.readline())
+                body = fp.read()
+
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        return metadata, body
+
+    def put(self, key: str, metadata: Dict[str, Any], body: bytes) -> None:
+        """Put the response into the cache, then evict the least recently used responses.
+
+        Arguments:
+            key: The cache key of the request.
+            metadata: The metadata of the response.
+            body: The body of the response.
+
+        """
+        os.makedirs(self._dirpath, exist_ok=True)
+        with NamedTemporaryFile("wb", dir=self._dirpath, suffix=".tmp", delete=False) as fp:
+            fp.write(json.dumps(metadata).encode())
+            fp.write(b"\n")
+            fp.write(body)
+
+        os.replace(fp.name, os.path.join(self._dirpath, key))
+        self._evict()
+
+    def clear(self) -> int:
+        """Remove all the cached responses.
+
+        Returns:
+            The number of the removed responses.
+
+        """
+        count = 0
+        for entry in _scan_dir(self._dirpath):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            count += 1
+
+        return count
+
+    def stat(self) -> Tuple[int, int]:
+        """Get the number and the total size of the cached responses.
+
+        Returns:
+            The number and the total size in bytes of the cached responses.
+
+        """
+        count = 0
+        total_size = 0
+        for entry in _scan_dir(self._dirpath):
+            try:
+                total_size += entry.stat().st_size
+            except FileNotFoundError:
+                continue
+            count += 1
+
+        return count, total_size
+
+    def _evict(self) -> None:
+        entries = []
+        total_size = 0
+        for entry in _scan_dir(self._dirpath):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self._size:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+
+class RateLimiter:
+    """The token buckets pacing the Github API requests, shared by the concurrent hit processes.
+
+    There is one bucket for each token and each rate limit resource of Github. The buckets are
+    stored in a json file guarded by a file lock. The requests are only paced when the remaining
+    quota reported by the 'X-RateLimit-*' headers is low, then the buckets are refilled at the pace
+    which spreads the remaining quota until its reset time.
+
+    Arguments:
+        path: The path of the json file to store the buckets.
+        burst: The max number of requests can be sent without waiting.
+
+    """
+
+    def __init__(self, path: str, burst: int = _BURST) -> None:
+        self._path = path
+        self._burst = burst
+
+    @staticmethod
+    def get_key(request: requests.PreparedRequest) -> str:
+        """Get the bucket key of the request, which is keyed by the token and the resource.
+
+        Arguments:
+            request: The request needs to be paced.
+
+        Returns:
+            The bucket key of the request.
+
+        """
+        authorization = request.headers.get("Authorization", "")
+        resource = "graphql" if urlsplit(str(request.url)).path == "/graphql" else "core"
+        return f"{sha256(authorization.encode()).hexdigest()[:16]}:{resource}"
+
+    def acquire(self, key: str, max_wait: float = _MAX_RATE_LIMIT_WAIT) -> float:
+        """Take a token from the bucket, sleep until one is available.
+
+        When the bucket is blocked longer than the max wait, the request is not delayed, so it
+        fails with the rate limit error of Github instead of hanging silently.
+
+        Arguments:
+            key: The bucket key of the request.
+            max_wait: The max seconds to sleep.
+
+        Returns:
+            The seconds slept.
+
+        """
+        slept = 0.0
+        while True:
+            with self._lock() as buckets:
+                delay, blocked = self._take(buckets, key, time())
+
+            if delay <= 0 or slept + delay > max_wait:
+                return slept
+
+            if blocked:
+                warning(f"Github API rate limit exceeded, retrying in {delay:.0f} seconds.")
+            sleep(delay)
+            slept += delay
+
+    def update(self, key: str, response: requests.Response) -> float:
+        """Update the bucket with the rate limit headers of the response.
+
+        Arguments:
+            key: The bucket key of the request.
+            response: The response of the request.
+
+        Returns:
+            The seconds to wait before retrying the request, 0 if it is not rate limited.
+
+        """
+        headers = response.headers
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        now = time()
+
+        delay = 0.0
+        if response.status_code in (403, 429):
+            retry_after = headers.get("Retry-After")
+            if retry_after is not None:
+                delay = max(_parse_retry_after(retry_after, now), 1)
+            elif remaining == "0" and reset is not None:
+                delay = max(int(reset) - now, 1)
+            elif b"secondary rate limit" in response.content.lower():
+                delay = _SECONDARY_LIMIT_WAIT
+
+        with self._lock() as buckets:
+            bucket = buckets.setdefault(key, {"tokens": self._burst, "updated": now})
+            if remaining is not None and reset is not None:
+                bucket["remaining"] = int(remaining)
+                bucket["reset"] = int(reset)
+            if delay:
+                bucket["blocked_until"] = max(bucket.get("blocked_until", 0), now + delay)
+
+            for expired_key in [k for k, v in buckets.items() if v["updated"] < now - _STATE_TTL]:
+                del buckets[expired_key]
+
+        return delay
+
+    def _take(self, buckets: Dict[str, Dict[str, Any]], key: str, now: float) -> Tuple[float, bool]:
+        bucket = buckets.setdefault(key, {"tokens": self._burst, "updated": now})
+
+        blocked_until = bucket.get("blocked_until", 0)
+        if now < blocked_until:
+            return blocked_until - now, True
+
+        if bucket.get("reset", 0) <= now or bucket["remaining"] > _LOW_REMAINING:
+            bucket["tokens"] = self._burst
+            bucket["updated"] = now
+            return 0, False
+
+        rate = max(bucket["remaining"] / (bucket["reset"] - now), _MIN_RATE)
+        tokens = min(self._burst, bucket["tokens"] + (now - bucket["updated"]) * rate)
+        bucket["updated"] = now
+        if tokens >= 1:
+            bucket["tokens"] = tokens - 1
+            return 0, False
+
+        bucket["tokens"] = tokens
+        return (1 - tokens) / rate, False
+
+    @contextmanager
+    def _lock(self) -> Iterator[Dict[str, Dict[str, Any]]]:
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with open(self._path, "a+", encoding="utf-8") as fp:
+            if fcntl:
+                fcntl.flock(fp, fcntl.LOCK_EX)
+
+            fp.seek(0)
+            try:
+                buckets = json.loads(fp.read())
+            except ValueError:
+                buckets = {}
+
+            yield buckets
+
+            fp.seek(0)
+            fp.truncate()
+            json.dump(buckets, fp)
+
+
+class CachingAdapter(HTTPAdapter):
+    """The HTTP adapter revalidates the cached GET responses with conditional requests.
+
+    Github does not count the '304 Not Modified' responses against the rate limit. All the
+    requests are paced by the rate limiter, and the rate limited ones are retried after waiting.
+
+    Arguments:
+        cache: The cache to store the responses.
+        limiter: The rate limiter to pace the requests.
+        kwargs: The keyword arguments for HTTPAdapter.
+
+    """
+
+    def __init__(self, cache: ResponseCache, limiter: RateLimiter, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._cache = cache
+        self._limiter = limiter
+
+    def send(  # type: ignore[override]  # pylint: disable=arguments-differ
+        self, request: requests.PreparedRequest, stream: bool = False, **kwargs: Any
+    ) -> requests.Response:
+        """Send the request, revalidate the cached response if it exists.
+
+        Arguments:
+            request: The request to send.
+            stream: Whether to stream the response content.
+            kwargs: The other keyword arguments for HTTPAdapter.send.
+
+        Returns:
+            The response of the request.
+
+        """
+        if request.method != "GET" or stream:
+            return self._send(request, stream, **kwargs)
+
+        key = self._cache.get_key(request)
+        cached = self._cache.get(key)
+        if cached:
+            metadata = cached[0]
+            if "etag" in metadata:
+                request.headers["If-None-Match"] = metadata["etag"]
+            if "last_modified" in metadata:
+                request.headers["If-Modified-Since"] = metadata["last_modified"]
+
+        response = self._send(request, stream, **kwargs)
+
+        if response.status_code == 304 and cached:
+            response.close()
+            metadata, body = cached
+            raw = HTTPResponse(
+                body=BytesIO(body),
+                headers=metadata["headers"],
+                status=metadata["status"],
+                preload_content=False,
+            )
+            return self.build_response(request, raw)
+
+        if response.status_code == 200:
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                metadata = {
+                    "status": response.status_code,
+                    "headers": {
+                        k: v
+                        for k, v in response.headers.items()
+                        if k.lower() not in _DROPPED_HEADERS
+                    },
+                }
+                if etag:
+                    metadata["etag"] = etag
+                if last_modified:
+                    metadata["last_modified"] = last_modified
+
+                self._cache.put(key, metadata, response.content)
+
+        return response
+
+    def _send(
+        self, request: requests.PreparedRequest, stream: bool, **kwargs: Any
+    ) -> requests.Response:
+        name = f"{request.method} {urlsplit(str(request.url)).path}"
+        key = self._limiter.get_key(request)
+        waited = 0.0
+        while True:
+            waited += self._limiter.acquire(key, _MAX_RATE_LIMIT_WAIT - waited)
+            with span(name, "github", url=request.url) as span_args:
+                response = super().send(request, stream=stream, **kwargs)
+                span_args["status"] = response.status_code
+
+            delay = self._limiter.update(key, response)
+            if not delay or waited + delay > _MAX_RATE_LIMIT_WAIT:
+                return response
+
+            # The retry is delayed by the blocked bucket in the next 'acquire'.
+            response.close()
+
+
+class _HTTPSConnection(HTTPSRequestsConnectionClass):  # type: ignore[misc]
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.session = get_session()
+
+    def close(self) -> None:
+        pass
+
+
+def _parse_retry_after(value: str, now: float) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    try:
+        return parsedate_to_datetime(value).timestamp() - now
+    except (TypeError, ValueError):
+        return _SECONDARY_LIMIT_WAIT
+
+
+def _scan_dir(dirpath: str) -> List["os.DirEntry[str]"]:
+    try:
+        with os.scandir(dirpath) as entries:
+            return [entry for entry in entries if not entry.name.endswith(".tmp")]
+    except FileNotFoundError:
+        return []
+
+
+_SESSION: Optional[requests.Session] = None
+
+
+def _no_auth(request: requests.PreparedRequest) -> requests.PreparedRequest:
+    return request
+
+
+def http_cache_dirpath() -> str:
+    """Get path of the HTTP response cache directory.
+
+    Returns:
+        The path of HTTP response cache directory.
+
+    """
+    return os.path.join(cache_dirpath(), "http")
+
+
+def rate_limit_filepath() -> str:
+    """Get path of the rate limit state file shared by the concurrent hit processes.
+
+    Returns:
+        The path of rate limit state file.
+
+    """
+    return os.path.join(cache_dirpath(), "ratelimit.json")
+
+
+def get_session() -> requests.Session:
+    """Get the keep-alive HTTP session shared by all the Github API requests.
+
+    Returns:
+        The shared requests session.
+
+    """
+    global _SESSION  # pylint: disable=global-statement
+
+    if _SESSION is None:
+        _SESSION = requests.Session()
+        # A non-None auth keeps requests from replacing the token header by the '.netrc' entry.
+        _SESSION.auth = _no_auth
+        _SESSION.mount(
+            "https://",
+            CachingAdapter(ResponseCache(http_cache_dirpath()), RateLimiter(rate_limit_filepath())),
+        )
+
+    return _SESSION
+
+
+def get_json(token: str, path: str, **params: Any) -> Any:
+    """Send a GET request to the Github REST API through the shared HTTP session.
+
+    Arguments:
+        token: The Github Access Token.
+        path: The path of the REST API, like '/repos/{owner}/{repo}'.
+        params: The query parameters of the request.
+
+    Returns:
+        The decoded json content of the response.
+
+    """
+    response = get_session().get(
+        f"{_API_URL}{path}",
+        params=params,
+        headers={"Authorization": f"token {token}", "Accept": "application/vnd.github+json"},
+        timeout=_TIMEOUT,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def get_github(token: str) -> Github:
+    """Get the Github client sending requests through the shared HTTP session.
+
+    Arguments:
+        token: The Github Access Token.
+
+    Returns:
+        The Github client.
+
+    """
+    Requester.injectConnectionClasses(HTTPRequestsConnectionClass, _HTTPSConnection)
+    return Github(token)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+#
+# Copyright 2022 Graviti. Licensed under MIT License.
+#
+
+"""Implementation of hit status."""
+
+import sys
+from subprocess import CalledProcessError
+from time import sleep
+from typing import Any, Dict, List, Optional, Tuple
+
+import click
+
+from hit.graphql import PullRequestInfo, get_open_pull_requests
+from hit.session import get_json
+from hit.utility import get_base_branch, get_repo_names, get_repo_state, read_config
+
+_CHECK_COLORS = {"success": "green", "failure": "red", "pending": "yellow"}
+_REVIEW_COLORS = {"approved": "green", "changes requested": "red"}
+_MERGEABLE_COLORS = {"mergeable": "green", "conflicting": "red"}
+_PAGE_SIZE = 100
+
+
+def _implement_status(watch: bool, interval: int) -> None:
+    try:
+        token = read_config()["github"]["token"]
+        origin_name, upstream_name = get_repo_names()
+        head_owner = origin_name.split("/", 1)[0]
+        base = get_base_branch()
+
+        branches = _get_branches(base)
+        pulls = _get_pull_requests(token, upstream_name, origin_name, branches)
+        lines = _render(branches, pulls)
+        for line in lines:
+            click.echo(line)
+
+        if not watch:
+            return
+
+        signature = _get_signature(token, upstream_name, head_owner)
+        while True:
+            sleep(interval)
+
+            latest_branches = _get_branches(base, refresh=True)
+            latest_signature = _get_signature(token, upstream_name, head_owner)
+            if (
+                latest_signature is None
+                or latest_signature != signature
+                or latest_branches != branches
+            ):
+                signature = latest_signature
+                branches = latest_branches
+                pulls = _get_pull_requests(token, upstream_name, origin_name, branches)
+            else:
+                pulls = _refresh_check_suites(token, upstream_name, pulls)
+
+            latest_lines = _render(branches, pulls)
+            _repaint(lines, latest_lines)
+            lines = latest_lines
+
+    except CalledProcessError:
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
+def _get_branches(base: str, refresh: bool = False) -> List[str]:
+    return sorted(branch for branch in get_repo_state(refresh).upstreams if branch != base)
+
+
+def _get_pull_requests(
+    token: str, upstream_name: str, origin_name: str, branches: List[str]
+) -> Dict[str, PullRequestInfo]:
+    return {
+        branch: pull_infos[0]
+        for branch, pull_infos in get_open_pull_requests(
+            token, upstream_name, origin_name, branches
+        ).items()
+        if pull_infos
+    }
+
+
+def _get_signature(
+    token: str, upstream_name: str, head_owner: str
+) -> Optional[List[Tuple[Any, ...]]]:
+    # The REST list is revalidated by conditional requests, which are free of rate limit, and any
+    # push, review or edit of a pull request changes its 'updated_at'.
+    pulls = get_json(
+        token,
+        f"/repos/{upstream_name}/pulls",
+        state="open",
+        sort="updated",
+        direction="desc",
+        per_page=_PAGE_SIZE,
+    )
+    if len(pulls) == _PAGE_SIZE:
+        # The pull requests of the owner may be out of the first page of a busy upstream repo.
+        return None
+
+    return [
+        (pull["number"], pull["updated_at"], pull["head"]["sha"])
+        for pull in pulls
+        if pull["head"]["user"] and pull["head"]["user"]["login"] == head_owner
+    ]
+
+
+def _refresh_check_suites(
+    token: str, upstream_name: str, pulls: Dict[str, PullRequestInfo]
+) -> Dict[str, PullRequestInfo]:
+    refreshed = {}
+    for branch, pull_info in pulls.items():
+        suites = get_json(
+            token,
+            f"/repos/{upstream_name}/commits/{pull_info.head_sha}/check-suites",
+            per_page=100,
+        )
+        refreshed[branch] = pull_info._replace(
+            check_suites=[
+                (suite["status"], suite["conclusion"]) for suite in suites["check_suites"]
+            ]
+        )
+
+    return refreshed
+
+
+def _render(branches: List[str], pulls: Dict[str, PullRequestInfo]) -> List[str]:
+    width = max([len("BRANCH")] + [len(branch) for branch in branches])
+    header = (
+        f"{'BRANCH':<{width}}  {'PR':<6}  {'REVIEW':<17}  {'MERGEABLE':<11}  {'CHECKS':<13}  URL"
+    )
+    lines = [click.style(header, bold=True)]
+    for branch in branches:
+        pull_info = pulls.get(branch)
+        if pull_info is None:
+            lines.append(f"{branch:<{width}}  -")
+            continue
+
+        review = _get_review(pull_info)
+        mergeable = pull_info.mergeable
+        checks = _get_checks(pull_info.check_suites)
+        lines.append(
+            f"{branch:<{width}}  {f'#{pull_info.number}':<6}  "
+            f"{click.style(f'{review:<17}', fg=_REVIEW_COLORS.get(review))}  "
+            f"{click.style(f'{mergeable:<11}', fg=_MERGEABLE_COLORS.get(mergeable))}  "
+            f"{click.style(f'{checks:<13}', fg=_CHECK_COLORS.get(checks.split()[0]))}  "
+            f"{click.style(pull_info.url, underline=True)}"
+        )
+
+    return lines
+
+
+def _get_review(pull_info: PullRequestInfo) -> str:
+    if pull_info.is_draft:
+        return "draft"
+
+    if pull_info.review_decision is None:
+        return "-"
+
+    return pull_info.review_decision.replace("_", " ")
+
+
+def _get_checks(check_suites: List[Tuple[str, Optional[str]]]) -> str:
+    if not check_suites:
+        return "-"
+
+    total = len(check_suites)
+    completed = sum(status == "completed" for status, _ in check_suites)
+    if any(
+        status == "completed" and conclusion != "success" for status, conclusion in check_suites
+    ):
+        return "failure"
+
+    if completed < total:
+        return f"pending {completed}/{total}"
+
+    return "success"
+
+
+def _repaint(lines: List[str], latest_lines: List[str]) -> None:
+    if not sys.stdout.isatty():
+        if latest_lines != lines:
+            click.echo()
+            for line in latest_lines:
+                click.echo(line)
+        return
+
+    if len(latest_lines) != len(lines):
+        click.echo(f"\x1b[{len(lines)}F\x1b[J", nl=False)
+        for line in latest_lines:
+            click.echo(line)
+        return
+
+    for index, (line, latest_line) in enumerate(zip(lines, latest_lines)):
+        if line != latest_line:
+            offset = len(lines) - index
+            click.echo(f"\x1b[{offset}F\x1b[2K{latest_line}\x1b[{offset}E", nl=False)
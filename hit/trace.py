@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+#
+# Copyright 2022 Graviti. Licensed under MIT License.
+#
+
+"""Opt-in tracing of hit CLI in Chrome trace-event format."""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class Tracer:
+    """The recorder of the complete ('X' phase) trace events."""
+
+    def __init__(self) -> None:
+        self._start = perf_counter()
+        self._events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, category: str, **args: Any) -> Iterator[Dict[str, Any]]:
+        """Record the duration of the context as a trace event.
+
+        Arguments:
+            name: The name of the event.
+            category: The category of the event.
+            args: The arguments of the event.
+
+        Yields:
+            The arguments of the event, which can be updated in the context.
+
+        """
+        start = perf_counter()
+        try:
+            yield args
+        finally:
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self._start) * 1e6,
+                "dur": (perf_counter() - start) * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": args,
+            }
+            with self._lock:
+                self._events.append(event)
+
+    def dump(self, path: str) -> None:
+        """Write the recorded events into a Chrome trace-event json file.
+
+        Arguments:
+            path: The path of the output file.
+
+        """
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump({"traceEvents": self._events, "displayTimeUnit": "ms"}, fp)
+
+    def summarize(self) -> List[Tuple[str, int, float]]:
+        """Summarize the recorded events by their names.
+
+        Returns:
+            The (name, count, total milliseconds) tuples sorted by the total time.
+
+        """
+        summary: Dict[str, Tuple[int, float]] = {}
+        for event in self._events:
+            count, total = summary.get(event["name"], (0, 0.0))
+            summary[event["name"]] = count + 1, total + event["dur"] / 1000
+
+        return sorted(
+            ((name, count, total) for name, (count, total) in summary.items()),
+            key=lambda item: item[2],
+            reverse=True,
+        )
+
+
+_TRACER: Optional[Tracer] = None
+
+
+@contextmanager
+def span(name: str, category: str, **args: Any) -> Iterator[Dict[str, Any]]:
+    """Record the duration of the context if the tracing is enabled.
+
+    Arguments:
+        name: The name of the event.
+        category: The category of the event.
+        args: The arguments of the event.
+
+    Yields:
+        The arguments of the event, which can be updated in the context.
+
+    """
+    if _TRACER is None:
+        yield args
+        return
+
+    with _TRACER.span(name, category, **args) as span_args:
+        yield span_args
+
+
+def start_tracing() -> Tracer:
+    """Enable the tracing, the subprocesses run by 'hit.utility.run' are recorded from now on.
+
+    Returns:
+        The Tracer records the events.
+
+    """
+    global _TRACER  # pylint: disable=global-statement
+
+    _TRACER = Tracer()
+    return _TRACER
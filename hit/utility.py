@@ -6,33 +6,85 @@
 """Graviti hit CLI utility functions."""
 
 import os
+import shutil
+import subprocess
 import sys
+import tempfile
 from configparser import ConfigParser
-from subprocess import PIPE, run
-from typing import Any, Dict, Iterable, List, NoReturn, Optional, Tuple
+from shlex import quote
+from subprocess import DEVNULL, PIPE, CalledProcessError, CompletedProcess
+from typing import Any, Dict, List, NoReturn, Optional, Tuple
 
 import click
 
-PR_CLOSED = "PR Closed: "
-
-ENV: Dict[str, Any] = {
-    k: v
-    for k, v in os.environ.items()
-    if not k.startswith("GIT_")
-    or k.startswith(("GIT_CONFIG_KEY_", "GIT_CONFIG_VALUE_"))
-    or k
-    in {
-        "GIT_EXEC_PATH",
-        "GIT_SSH",
-        "GIT_SSH_COMMAND",
-        "GIT_SSL_CAINFO",
-        "GIT_SSL_NO_VERIFY",
-        "GIT_CONFIG_COUNT",
-        "GIT_HTTP_PROXY_AUTHMETHOD",
-    }
+from hit.trace import span
+
+_GIT_ENV_KEYS = {
+    "GIT_EXEC_PATH",
+    "GIT_SSH",
+    "GIT_SSH_COMMAND",
+    "GIT_SSL_CAINFO",
+    "GIT_SSL_NO_VERIFY",
+    "GIT_CONFIG_COUNT",
+    "GIT_HTTP_PROXY_AUTHMETHOD",
 }
 
 
+def _get_env() -> Dict[str, Any]:
+    return {
+        k: v
+        for k, v in os.environ.items()
+        if not k.startswith("GIT_")
+        or k.startswith(("GIT_CONFIG_KEY_", "GIT_CONFIG_VALUE_"))
+        or k in _GIT_ENV_KEYS
+    }
+
+
+ENV: Dict[str, Any] = _get_env()
+
+
+def reload_env() -> None:
+    """Rebuild the environment of the git subprocesses from the current 'os.environ'.
+
+    'ENV' is updated in place, so the modules which have imported it get the new environment.
+
+    """
+    ENV.clear()
+    ENV.update(_get_env())
+
+
+_SSH_CONTROL_PERSIST = 60
+
+
+def run(args: List[str], *, check: bool, **kwargs: Any) -> "CompletedProcess[bytes]":
+    """Run the command by 'subprocess.run', the command is recorded when the tracing is enabled.
+
+    All the subprocesses of hit CLI are run by this function, so the tracing covers the modules
+    imported before it is enabled.
+
+    Arguments:
+        args: The command and its arguments.
+        check: Whether to raise CalledProcessError when the command fails.
+        kwargs: The other keyword arguments for 'subprocess.run'.
+
+    Returns:
+        The completed process.
+
+    Raises:
+        CalledProcessError: When the check is enabled and the command fails.
+
+    """
+    with span(" ".join(args[:2]), "subprocess", command=" ".join(args)) as span_args:
+        try:
+            result = subprocess.run(args, check=check, **kwargs)
+        except CalledProcessError as error:
+            span_args["returncode"] = error.returncode
+            raise
+
+        span_args["returncode"] = result.returncode
+        return result
+
+
 def config_filepath() -> str:
     """Get path of the config file.
 
@@ -44,6 +96,20 @@ def config_filepath() -> str:
     return os.path.join(os.environ[home], ".hitconfig")
 
 
+def cache_dirpath() -> str:
+    """Get path of the cache directory.
+
+    Returns:
+        The path of cache directory.
+
+    """
+    if os.name == "nt":
+        return os.path.join(os.environ["LOCALAPPDATA"], "hit", "cache")
+
+    cache_home = os.environ.get("XDG_CACHE_HOME", os.path.join(os.environ["HOME"], ".cache"))
+    return os.path.join(cache_home, "hit")
+
+
 def read_config() -> ConfigParser:
     """Get config parser of the config file.
 
@@ -62,6 +128,128 @@ def read_config() -> ConfigParser:
     return config_parser
 
 
+def start_ssh_multiplexing() -> Optional[str]:
+    """Share one SSH connection among all the git network operations of the command.
+
+    A managed 'GIT_SSH_COMMAND' with a ControlMaster socket is injected into ENV, unless the ssh
+    command is customized by 'GIT_SSH', 'GIT_SSH_COMMAND' or 'core.sshCommand'.
+
+    Returns:
+        The directory of the control sockets, None if the multiplexing is not enabled.
+
+    """
+    if os.name == "nt" or "GIT_SSH" in ENV or "GIT_SSH_COMMAND" in ENV:
+        return None
+
+    result = run(["git", "config", "--get", "core.sshCommand"], env=ENV, stdout=PIPE, check=False)
+    if result.stdout.strip():
+        return None
+
+    control_dir = tempfile.mkdtemp(prefix="hit-ssh-")
+    control_path = os.path.join(control_dir, "%r@%h:%p")
+    ENV["GIT_SSH_COMMAND"] = (
+        f"ssh -o ControlMaster=auto -o ControlPersist={_SSH_CONTROL_PERSIST} "
+        f"-o ControlPath={quote(control_path)}"
+    )
+    return control_dir
+
+
+def stop_ssh_multiplexing(control_dir: str) -> None:
+    """Close the SSH master connections and remove their control sockets.
+
+    Arguments:
+        control_dir: The directory of the control sockets.
+
+    """
+    for name in os.listdir(control_dir):
+        run(
+            ["ssh", "-o", f"ControlPath={os.path.join(control_dir, name)}", "-O", "exit", "_"],
+            env=ENV,
+            stdout=DEVNULL,
+            stderr=DEVNULL,
+            check=False,
+        )
+
+    shutil.rmtree(control_dir, ignore_errors=True)
+    ENV.pop("GIT_SSH_COMMAND", None)
+
+
+_REF_FORMAT = "%(HEAD)%00%(refname:short)%00%(upstream:short)%00%(upstream:track)"
+
+
+class RepoState:
+    """The snapshot of the local repo state.
+
+    The snapshot is built from one 'git config' and one 'git for-each-ref' call, so all the
+    repo queries of a command share two git processes instead of forking one for each query.
+
+    Arguments:
+        config: The local git config of the repo, the keys are in lower case.
+        current_branch: The name of current branch, empty string if HEAD is detached.
+        upstreams: The mapping from local branch names to their remote branch names.
+
+    """
+
+    def __init__(
+        self, config: Dict[str, str], current_branch: str, upstreams: Dict[str, Optional[str]]
+    ) -> None:
+        self.config = config
+        self.current_branch = current_branch
+        self.upstreams = upstreams
+
+    @classmethod
+    def load(cls) -> "RepoState":
+        """Load the snapshot of the repo state from git.
+
+        Returns:
+            The loaded RepoState instance.
+
+        """
+        result = run(["git", "config", "--list", "--local", "-z"], env=ENV, check=True, stdout=PIPE)
+        config = {}
+        for item in result.stdout.decode().split("\0"):
+            if item:
+                key, _, value = item.partition("\n")
+                config[key] = value
+
+        result = run(
+            ["git", "for-each-ref", f"--format={_REF_FORMAT}", "refs/heads"],
+            env=ENV,
+            check=True,
+            stdout=PIPE,
+        )
+        current_branch = ""
+        upstreams: Dict[str, Optional[str]] = {}
+        for line in result.stdout.decode().splitlines():
+            head, branch, upstream, track = line.split("\0")
+            if head == "*":
+                current_branch = branch
+            upstreams[branch] = upstream if upstream and track != "[gone]" else None
+
+        return cls(config, current_branch, upstreams)
+
+
+_REPO_STATE: Optional[RepoState] = None
+
+
+def get_repo_state(refresh: bool = False) -> RepoState:
+    """Get the snapshot of current repo state.
+
+    Arguments:
+        refresh: Whether to reload the snapshot from git.
+
+    Returns:
+        The RepoState instance of current repo.
+
+    """
+    global _REPO_STATE  # pylint: disable=global-statement
+
+    if refresh or _REPO_STATE is None:
+        _REPO_STATE = RepoState.load()
+
+    return _REPO_STATE
+
+
 def get_current_branch() -> str:
     """Get the name of current branch.
 
@@ -69,8 +257,7 @@ def get_current_branch() -> str:
         The name of current branch
 
     """
-    result = run(["git", "branch", "--show-current"], env=ENV, check=True, stdout=PIPE)
-    return result.stdout.decode().strip()
+    return get_repo_state().current_branch
 
 
 def get_remote_branch(branch: str = "") -> Optional[str]:
@@ -83,12 +270,8 @@ def get_remote_branch(branch: str = "") -> Optional[str]:
         The name of remote branch, return None if it does not exist.
 
     """
-    upstream_command = ["git", "rev-parse", "--abbrev-ref", f"{branch}@{{u}}"]
-    result = run(upstream_command, env=ENV, check=False, stdout=PIPE, stderr=PIPE)
-    if result.returncode != 0:
-        return None
-
-    return result.stdout.decode().strip()
+    repo_state = get_repo_state()
+    return repo_state.upstreams.get(branch if branch else repo_state.current_branch)
 
 
 _BASE_BRANCH_KEY = "hit.baseBranch"
@@ -102,6 +285,8 @@ def set_base_branch(branch: str) -> None:
 
     """
     run(["git", "config", "--local", _BASE_BRANCH_KEY, branch], env=ENV, check=True)
+    if _REPO_STATE is not None:
+        _REPO_STATE.config[_BASE_BRANCH_KEY.lower()] = branch
 
 
 def get_base_branch() -> str:
@@ -111,25 +296,77 @@ def get_base_branch() -> str:
         The name of the base branch.
 
     """
-    result = run(
-        ["git", "config", "--local", _BASE_BRANCH_KEY],
-        env=ENV,
-        check=True,
-        stdout=PIPE,
-        stderr=PIPE,
-    )
-    base = result.stdout.decode().strip()
+    base = get_repo_state().config.get(_BASE_BRANCH_KEY.lower())
     if not base:
         fatal_and_kill("Get base branch failed.")
 
     return base
 
 
+_PULL_REQUEST_KEY = "hitPullRequest"
+
+
+def set_pull_request_number(branch: str, number: Optional[int]) -> None:
+    """Cache the pull request number of the branch in the local git config.
+
+    The number is stored under the 'branch.<name>' section, so it is removed together with the
+    branch by 'git branch -D'.
+
+    Arguments:
+        branch: The name of the branch.
+        number: The number of the pull request, None for removing the cached number.
+
+    """
+    key = f"branch.{branch}.{_PULL_REQUEST_KEY}"
+    if number is None:
+        run(["git", "config", "--local", "--unset", key], env=ENV, check=False)
+    else:
+        run(["git", "config", "--local", key, str(number)], env=ENV, check=True)
+
+    if _REPO_STATE is not None:
+        config_key = f"branch.{branch}.{_PULL_REQUEST_KEY.lower()}"
+        if number is None:
+            _REPO_STATE.config.pop(config_key, None)
+        else:
+            _REPO_STATE.config[config_key] = str(number)
+
+
+def get_pull_request_number(branch: str) -> Optional[int]:
+    """Get the cached pull request number of the branch.
+
+    Arguments:
+        branch: The name of the branch.
+
+    Returns:
+        The number of the pull request, None if it is not cached.
+
+    """
+    number = get_repo_state().config.get(f"branch.{branch}.{_PULL_REQUEST_KEY.lower()}")
+    return int(number) if number else None
+
+
+def _is_github_ssh_url(url: str) -> bool:
+    return url.startswith("git@github.com:") and url.endswith(".git")
+
+
 def _get_repo_name(remote_name: str) -> str:
-    result = run(["git", "remote", "get-url", remote_name], env=ENV, stdout=PIPE, check=True)
-    ssh_url = result.stdout.decode().strip()
-    if not ssh_url.startswith("git@github.com:") or not ssh_url.endswith(".git"):
-        fatal_and_kill("Remote url '{ssh_url}' is not a github SSH key!")
+    ssh_url = get_repo_state().config.get(f"remote.{remote_name}.url", "")
+    if not _is_github_ssh_url(ssh_url):
+        # The raw url in the local config skips the 'url.<base>.insteadOf' rewriting and the
+        # remotes defined outside the local config, which are resolved by 'git remote get-url'.
+        result = run(
+            ["git", "remote", "get-url", remote_name],
+            env=ENV,
+            stdout=PIPE,
+            stderr=DEVNULL,
+            check=False,
+        )
+        if result.returncode != 0:
+            fatal_and_kill(f"Remote '{remote_name}' not found!")
+        ssh_url = result.stdout.decode().strip()
+
+    if not _is_github_ssh_url(ssh_url):
+        fatal_and_kill(f"Remote url '{ssh_url}' is not a github SSH key!")
 
     return ssh_url[15:-4]
 
@@ -152,86 +389,142 @@ def clean_branch(branch: str, base: Optional[str], yes: bool) -> None:
         base: The base branch name.
         yes: Run non-interactively with 'yes' to all prompts.
 
+    """
+    clean_branches([branch], base, yes)
+
+
+def clean_branches(branches: List[str], base: Optional[str], yes: bool) -> None:
+    """Delete the branches and their upstream branches with one git call for each step.
+
+    Arguments:
+        branches: The target branch names.
+        base: The base branch name, checkout to it before deleting if it is given.
+        yes: Run non-interactively with 'yes' to all prompts.
+
     """
     click.secho("> Cleaning:", bold=True)
 
     run(["git", "fetch", "--prune"], env=ENV, check=True)
 
-    remote_branch = get_remote_branch(branch)
+    repo_state = get_repo_state(refresh=True)
+    upstreams = repo_state.upstreams
+    remote_branches = []
+    for branch in branches:
+        remote_branch = upstreams.get(branch)
+        if remote_branch:
+            remote_branches.append(remote_branch)
 
     if not yes:
-        if remote_branch:
-            message = (
-                f"Local branch '{branch}' and "
-                f"remote branch '{remote_branch}' will be completely deleted."
-            )
+        local_message = _describe_branches("Local", branches)
+        if remote_branches:
+            remote_message = _describe_branches("remote", remote_branches)
+            message = f"{local_message} and {remote_message} will be completely deleted."
         else:
             message = (
-                f"Remote branch not found.\nLocal branch '{branch}' will be completely deleted."
+                f"Remote {_plural('branch', branches)} not found.\n"
+                f"{local_message} will be completely deleted."
             )
         click.secho(message, fg="yellow")
         click.confirm("Do you want to continue?", abort=True)
 
     if base:
         run(["git", "checkout", base], env=ENV, check=True)
+        repo_state.current_branch = base
 
-    click.echo("\n>> Deleting local branch:")
-    run(["git", "branch", "-D", branch], env=ENV, check=True)
-
-    if remote_branch:
-        click.echo("\n>> Deleting remote branch:")
-        run(
-            ["git", "push", "--prune", "--delete"] + remote_branch.split("/", 1),
-            env=ENV,
-            check=True,
-        )
-
+    click.echo(f"\n>> Deleting local {_plural('branch', branches)}:")
+    run(["git", "branch", "-D", *branches], env=ENV, check=True)
+    for branch in branches:
+        upstreams.pop(branch, None)
 
-def clean_commit_message(lines: Iterable[str]) -> List[str]:
-    """Chean the commit message.
+    remotes: Dict[str, List[str]] = {}
+    for remote_branch in remote_branches:
+        remote, name = remote_branch.split("/", 1)
+        remotes.setdefault(remote, []).append(name)
 
-    Arguments:
-        lines: The commite messsage lines.
+    for remote, names in remotes.items():
+        click.echo(f"\n>> Deleting remote {_plural('branch', names)}:")
+        run(["git", "push", "--prune", "--delete", remote, *names], env=ENV, check=True)
 
-    Returns:
-        The commit message lines after cleaning.
-
-    """
-    results = []
-    is_blank = True
-    for line in lines:
-        line = line.rstrip()
-        if line.startswith("#"):
-            continue
-
-        if not line or line.startswith(PR_CLOSED):
-            if not is_blank:
-                is_blank = True
-                results.append("")
-            continue
 
-        is_blank = False
-        results.append(line)
+def _plural(word: str, items: List[str]) -> str:
+    return word if len(items) == 1 else f"{word}es"
 
-    if not is_blank:
-        results.append("")
 
-    return results
+def _describe_branches(kind: str, branches: List[str]) -> str:
+    names = ", ".join(f"'{branch}'" for branch in branches)
+    return f"{kind} {_plural('branch', branches)} {names}"
 
 
 def update_branch(branch: str) -> None:
     """Pull latest code from upstream, and push it to origin.
 
+    The working tree is only touched when the branch is checked out, otherwise the branch is
+    fast-forwarded by a fetch refspec.
+
     Arguments:
         branch: The branch name of the branch needs to be updated.
 
     """
+    pull_command, push_command = get_update_commands(branch, get_current_branch())
+
     click.secho("> Updating:", bold=True)
     click.echo(f">> Pulling '{branch}' from upstream:")
-    run(["git", "pull", "upstream", branch, "--ff-only", "--no-rebase"], env=ENV, check=True)
+    run(["git", *pull_command], env=ENV, check=True)
 
     click.echo(f"\n>> Pushing '{branch}' to origin:")
-    run(["git", "push"], env=ENV, check=True)
+    run(["git", *push_command], env=ENV, check=True)
+
+
+def get_update_commands(branch: str, current_branch: str) -> Tuple[List[str], List[str]]:
+    """Get the git commands to pull the branch from upstream and push it to origin.
+
+    Arguments:
+        branch: The branch name of the branch needs to be updated.
+        current_branch: The name of the checked out branch.
+
+    Returns:
+        The arguments of the git pull (or fetch) command and the git push command.
+
+    """
+    pull_command = (
+        ["pull", "upstream", branch, "--ff-only", "--no-rebase"]
+        if current_branch == branch
+        else ["fetch", "upstream", f"{branch}:{branch}"]
+    )
+    return pull_command, ["push", "origin", f"{branch}:{branch}"]
+
+
+def get_stack_branches(base: str) -> List[str]:
+    """Get the stack of the local branches between the base branch and HEAD.
+
+    Arguments:
+        base: The name of the base branch.
+
+    Returns:
+        The names of the branches from the bottom to the top of the stack.
+
+    """
+    result = run(
+        ["git", "log", "--reverse", "--decorate-refs=refs/heads", "--format=%D", f"{base}..HEAD"],
+        env=ENV,
+        stdout=PIPE,
+        check=True,
+    )
+    branches = []
+    for line in result.stdout.decode().splitlines():
+        if not line:
+            continue
+
+        names = [name.replace("HEAD -> ", "", 1) for name in line.split(", ")]
+        if len(names) > 1:
+            fatal_and_kill(f"Branches {', '.join(names)} point to the same commit!")
+
+        branches.append(names[0])
+
+    if not branches:
+        fatal_and_kill(f"No branch found between HEAD and base branch ({base})!")
+
+    return branches
 
 
 def fatal(message: str) -> None: